@@ -0,0 +1,29 @@
+from kivy.clock import Clock
+from concurrent.futures import ThreadPoolExecutor
+
+### Background work, results on the Kivy thread
+###################################################
+# Decoding runs on a shared thread pool. GPU uploads must happen on the
+# Kivy thread, so the callback is scheduled with the Clock.
+# The callback receives the finished Future, a cancelled Future is not
+# delivered.
+
+_POOL = None
+WORKERS = 2
+
+def pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=WORKERS,
+                                   thread_name_prefix='decode')
+    return _POOL
+
+def run_in_background(callback, function, *args):
+    future = pool().submit(function, *args)
+
+    def done(future):
+        if not future.cancelled():
+            Clock.schedule_once(lambda dt: callback(future))
+
+    future.add_done_callback(done)
+    return future
@@ -0,0 +1,74 @@
+########################################################################
+#
+# Geometry Benchmark
+#
+# Compares the shapegeometry backends on 1 to 10,000 rotated squares.
+# `hits` tests every shape against a point, `inside_rect` tests every
+# shape against a rectangle. Times are per call.
+#
+# `numpy` always uses arrays, `numpy+py` is NumpyGeometry as GestureCanvas
+# uses it, with the Python lists for batches under NumpyGeometry.BATCH.
+#
+# Usage:
+#     python geometrybench.py [--calls N]
+#
+###########################################################################
+
+from math import cos, sin, pi
+from random import Random
+from time import perf_counter
+import argparse
+
+from shapegeometry import PythonGeometry, NumpyGeometry, numpy
+
+SIZES = (1, 10, 100, 1000, 10000)
+
+def squares(count, seed=0):
+    # count rotated squares in an 800 x 600 area
+    rand = Random(seed)
+    for i in range(count):
+        cx = rand.uniform(50, 750)
+        cy = rand.uniform(50, 550)
+        h = rand.uniform(5, 40)
+        a = rand.uniform(0, pi / 2)
+        c, s = cos(a) * h, sin(a) * h
+        yield ([cx - c + s, cx + c + s, cx + c - s, cx - c - s],
+               [cy - s - c, cy + s - c, cy + s + c, cy - s + c])
+
+def time_per_call(function, calls):
+    start = perf_counter()
+    for i in range(calls):
+        function()
+    return (perf_counter() - start) / calls
+
+def run(backend, count, calls):
+    geometry = backend()
+    for box_x, box_y in squares(count):
+        geometry.append(box_x, box_y)
+    indices = list(range(count))
+    hits = time_per_call(lambda: geometry.hits(indices, 400, 300), calls)
+    inside = time_per_call(
+        lambda: geometry.inside_rect(indices, 0, 0, 800, 600), calls)
+    return hits, inside
+
+def main():
+    parser = argparse.ArgumentParser(description='Geometry backend benchmark')
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+    backends = [('python', PythonGeometry)]
+    if numpy is not None:
+        backends.append(('numpy', lambda: NumpyGeometry(batch=0)))
+        backends.append(('numpy+py', NumpyGeometry))
+    else:
+        print('NumPy is not installed, only the Python backend is measured.')
+    print('{:<9} {:>7} {:>12} {:>16}'.format('backend', 'shapes',
+                                             'hits us', 'inside_rect us'))
+    for count in SIZES:
+        for name, backend in backends:
+            hits, inside = run(backend, count, args.calls)
+            print('{:<9} {:>7} {:>12.1f} {:>16.1f}'.format(name, count,
+                                                           hits * 1e6,
+                                                           inside * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+from kivy.graphics import Color, Rectangle
+from kivy.properties import ColorProperty
+
+### A background for gesture widgets
+###################################################
+# A mixin for a Widget, drawn in canvas.before in `background_color`.
+# The instructions are created once and follow the widget's pos and size,
+# a resize or a screen transition updates them in place.
+
+class GestureBackground:
+
+    background_color = ColorProperty([0.5, 0.5, 0.5, 1])
+
+    def __init__(self, **args):
+        super().__init__(**args)
+        with self.canvas.before:
+            self._background_color = Color(rgba=self.background_color)
+            self._background = Rectangle(pos=self.pos, size=self.size)
+        self.fbind('pos', self._update_background)
+        self.fbind('size', self._update_background)
+
+    def on_background_color(self, instance, value):
+        if hasattr(self, '_background_color'):
+            self._background_color.rgba = value
+
+    def _update_background(self, *args):
+        self._background.pos = self.pos
+        self._background.size = self.size
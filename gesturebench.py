@@ -0,0 +1,388 @@
+########################################################################
+#
+# Gesture Benchmark
+#
+# A headless driver that replays synthetic touch streams into
+# `CommonGestures` (save.py) and the example widgets `GestureLabel`,
+# `GestureReadout`, `GestureCanvas`, and `ZoomImage`.
+#
+# Time is virtual, the Kivy Clock is advanced by the driver, so long press
+# and tap timers fire deterministically and a run does not wait in real time.
+# As in the Kivy event loop, touch moves arrive at the digitizer rate and
+# Clock events are processed once per display frame.
+#
+# For each (target, gesture) pair it reports events/sec, the p50 and p99
+# latency of each on_touch_* call, and the memory allocated per gesture.
+#
+# Usage:
+#     python gesturebench.py [--repeat N] [--target NAME] [--gesture NAME]
+#                            [--coalesce] [--shapes N] [--trace FILE]
+#                            [--replay FILE]
+#
+# --replay replays a touchrecord.py recording, reported as the gesture
+# 'replay', after any gestures named with --gesture. The targets are
+# resized to the recorded widget size. 'replay' is not a --gesture
+# choice. Each replay starts on a frame boundary, so every replay drives
+# the Clock identically.
+# --trace saves a Chrome trace (gesturetrace.py) of the targets that
+# support tracing, the timing includes the tracing overhead. Touch times
+# are virtual, so the trace's since_touch_ms values are not meaningful.
+#
+###########################################################################
+
+import os
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_LOG_MODE', 'PYTHON')
+
+from kivy.config import Config
+Config.set('graphics', 'window_state', 'hidden')
+
+from kivy.clock import Clock
+from kivy.input.motionevent import MotionEvent
+from time import perf_counter, sleep
+from math import pi, cos, sin
+import argparse
+import gc
+import tracemalloc
+
+from gesturetrace import GestureTracer
+from touchrecord import TouchRecording, BUTTONS, DOWN, MOVE, UP, DOUBLE_TAP
+
+WIDTH = 800
+HEIGHT = 600
+FRAME = 1 / 60            # sec, display refresh
+SAMPLE = 1 / 240          # sec, a high rate digitizer
+
+### A synthetic touch
+###################################################
+
+class BenchTouch(MotionEvent):
+    # Positions are in window pixels; `scale_for_screen(2, 2)` maps
+    # the 0-1 range onto 0-1 pixels so sx, sy are used unchanged.
+    def __init__(self, id, x, y, t, button=None):
+        super().__init__('bench', id, (x, y), is_touch=True)
+        self.profile = ['pos']
+        if button:
+            self.profile.append('button')
+            self.button = button
+        self.scale_for_screen(2, 2)
+        self.time_start = self.time_update = t
+
+    def depack(self, args):
+        self.sx, self.sy = args
+        super().depack(args)
+
+    def move_to(self, x, y, t):
+        self.move((x, y))
+        self.scale_for_screen(2, 2)
+        self.time_update = t
+
+### The driver
+###################################################
+
+class TouchDriver:
+    # Feeds touches to a widget, advancing a virtual Kivy Clock.
+    # The latency of every on_touch_* call is appended to `latencies`,
+    # unless it is None.
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.latencies = []
+        self.now = Clock._last_tick
+        self._next_id = 0
+
+    def advance(self, dt):
+        # Run the Clock for each display frame within dt
+        self.now += dt
+        while self.now - Clock._last_tick >= FRAME:
+            Clock._last_tick = min(self.now, Clock._last_tick + FRAME)
+            Clock._process_events()
+
+    def down(self, x, y, dt=0, button=None, double_tap=False):
+        self.advance(dt)
+        self._next_id += 1
+        touch = BenchTouch(self._next_id, x, y, self.now, button)
+        touch.is_double_tap = double_tap
+        self._dispatch(self.widget.on_touch_down, touch)
+        touch.dispatch_done()
+        return touch
+
+    def move(self, touch, x, y, dt=SAMPLE):
+        self.advance(dt)
+        touch.move_to(x, y, self.now)
+        self._dispatch(self.widget.on_touch_move, touch)
+        touch.dispatch_done()
+
+    def up(self, touch, dt=0):
+        self.advance(dt)
+        touch.time_end = self.now
+        self._dispatch(self.widget.on_touch_up, touch)
+
+    def _dispatch(self, handler, touch):
+        if self.latencies is None:
+            handler(touch)
+            return
+        start = perf_counter()
+        handler(touch)
+        self.latencies.append(perf_counter() - start)
+
+### Synthetic gestures
+###################################################
+# Each gesture starts near (x, y) and leaves the recognizer idle.
+
+def tap(d, x, y):
+    t = d.down(x, y)
+    d.up(t, 0.05)
+    d.advance(1)
+
+def double_tap(d, x, y):
+    t = d.down(x, y)
+    d.up(t, 0.05)
+    t = d.down(x, y, 0.1, double_tap=True)
+    d.up(t, 0.05)
+    d.advance(1)
+
+def long_press(d, x, y):
+    t = d.down(x, y)
+    d.up(t, 0.6)
+    d.advance(1)
+
+def drag(d, x, y):
+    t = d.down(x, y)
+    for i in range(120):
+        d.move(t, x + i, y + i / 2)
+    d.up(t)
+    d.advance(1)
+
+def long_press_drag(d, x, y):
+    t = d.down(x, y)
+    d.advance(0.6)
+    for i in range(120):
+        d.move(t, x + i, y - i / 2)
+    d.up(t)
+    d.advance(1)
+
+def swipe(d, x, y):
+    t = d.down(x - 150, y)
+    for i in range(16):
+        d.move(t, x - 150 + 20 * i, y)
+    d.up(t)
+    d.advance(1)
+
+def scale(d, x, y):
+    t0 = d.down(x - 20, y)
+    t1 = d.down(x + 20, y, 0.01)
+    # spread then pinch, so a repeated gesture leaves the zoom unchanged
+    for i in list(range(15)) + list(range(15, 0, -1)):
+        d.move(t0, x - 20 - 2 * i, y - i)
+        d.move(t1, x + 20 + 2 * i, y + i, 0)
+    d.up(t0)
+    d.up(t1, 0.01)
+    d.advance(1)
+
+def multi_touch(d, x, y):
+    # Five fingers spread and turn, then return, a finger lifts and
+    # touches down again part way through.
+    fingers = 5
+    def finger(i, r, angle):
+        a = angle + 2 * pi * i / fingers
+        return x + r * cos(a), y + r * sin(a)
+    ts = [d.down(*finger(i, 30, 0), 0.01) for i in range(fingers)]
+    for k in list(range(15)) + list(range(15, 0, -1)):
+        if k == 8:
+            d.up(ts[-1])
+            ts[-1] = d.down(*finger(fingers - 1, 30 + 2 * k, k / 20), 0.01)
+        for i, t in enumerate(ts):
+            d.move(t, *finger(i, 30 + 2 * k, k / 20), 0 if i else SAMPLE)
+    for t in ts:
+        d.up(t, 0.01)
+    d.advance(1)
+
+def wheel_storm(d, x, y):
+    for i in range(20):
+        t = d.down(x, y, 0.01, button='scrolldown')
+        d.up(t)
+    d.advance(1)
+
+def page_storm(d, x, y):
+    for i in range(20):
+        t = d.down(x, y, 0.01, button='scrollright')
+        d.up(t)
+    d.advance(1)
+
+def replay(recording):
+    # A gesture that replays a TouchRecording, positions are unchanged
+    # so the target must be at the origin, with the recorded size.
+    def gesture(d, x, y):
+        d.advance(Clock._last_tick + FRAME - d.now)
+        start = d.now
+        touches = {}
+        for kind, flags, button, id, t, x, y in recording.events:
+            dt = max(0, start + t - d.now)
+            if kind == DOWN:
+                touches[id] = d.down(x, y, dt, BUTTONS[button],
+                                     bool(flags & DOUBLE_TAP))
+            elif kind == MOVE and id in touches:
+                d.move(touches[id], x, y, dt)
+            elif kind == UP and id in touches:
+                d.up(touches.pop(id), dt)
+        # A recording may end with touches down
+        for touch in touches.values():
+            d.up(touch)
+        d.advance(1)
+    return gesture
+
+GESTURES = {'tap': tap,
+            'double_tap': double_tap,
+            'long_press': long_press,
+            'drag': drag,
+            'long_press_drag': long_press_drag,
+            'swipe': swipe,
+            'scale': scale,
+            'multi_touch': multi_touch,
+            'wheel_storm': wheel_storm,
+            'page_storm': page_storm}
+
+### Targets
+###################################################
+
+def _common_gestures():
+    from save import CommonGestures
+    return CommonGestures()
+
+def _gesture_label():
+    from gesturelabel import GestureLabel
+    return GestureLabel()
+
+def _gesture_readout():
+    from gesturelabel import GestureReadout
+    return GestureReadout()
+
+def _gesture_canvas():
+    from gesturecanvas import GestureCanvas
+    return GestureCanvas()
+
+def _zoom_image():
+    from zoomimage import ZoomImage
+    here = os.path.dirname(os.path.abspath(__file__))
+    return ZoomImage(source=os.path.join(here, 'test.jpg'))
+
+def _zoom_image_tiled():
+    from zoomimage import ZoomImage
+    here = os.path.dirname(os.path.abspath(__file__))
+    return ZoomImage(source=os.path.join(here, 'test.jpg'), tiled=True,
+                     tile_size=256)
+
+TARGETS = {'CommonGestures': _common_gestures,
+           'GestureLabel': _gesture_label,
+           'GestureReadout': _gesture_readout,
+           'GestureCanvas': _gesture_canvas,
+           'ZoomImage': _zoom_image,
+           'ZoomImageTiled': _zoom_image_tiled}
+
+def make_target(name, coalesce=False, shapes=1):
+    widget = TARGETS[name]()
+    if coalesce and hasattr(widget, 'coalesce_moves'):
+        widget.coalesce_moves = True
+    if hasattr(widget, 'shape_count'):
+        widget.shape_count = shapes
+    widget.size_hint = (None, None)
+    widget.pos = (0, 0)
+    widget.size = (WIDTH, HEIGHT)
+    # Wait for a background image load
+    while getattr(widget, 'loading', False):
+        sleep(0.01)
+        Clock._process_events()
+    return widget
+
+### Measurement
+###################################################
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+def run(widget, gesture, repeat):
+    # Timing pass, then an allocation pass with tracemalloc running
+    x, y = WIDTH / 2, HEIGHT / 2
+    d = TouchDriver(widget)
+    gesture(d, x, y)                       # warm up
+    d.latencies = []
+    collections = sum(s['collections'] for s in gc.get_stats())
+    for i in range(repeat):
+        gesture(d, x, y)
+    collections = sum(s['collections'] for s in gc.get_stats()) - collections
+    latencies = d.latencies
+
+    d.latencies = None
+    tracemalloc.start()
+    peak = 0
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(repeat):
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        gesture(d, x, y)
+        peak += tracemalloc.get_traced_memory()[1] - start
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return {'events': len(latencies),
+            'events_per_sec': len(latencies) / sum(latencies),
+            'p50_us': percentile(latencies, 0.5) * 1e6,
+            'p99_us': percentile(latencies, 0.99) * 1e6,
+            'peak_bytes_per_gesture': peak / repeat,
+            'retained_bytes_per_gesture': retained / repeat,
+            'gc_collections': collections}
+
+def report(rows):
+    header = '{:<15} {:<16} {:>7} {:>10} {:>8} {:>8} {:>10} {:>9} {:>4}'
+    line = '{:<15} {:<16} {:>7} {:>10.0f} {:>8.1f} {:>8.1f} {:>10.0f} ' +\
+        '{:>9.0f} {:>4}'
+    print(header.format('target', 'gesture', 'events', 'events/s',
+                        'p50 us', 'p99 us', 'peak B/g', 'kept B/g', 'gc'))
+    for target, gesture, r in rows:
+        print(line.format(target, gesture, r['events'], r['events_per_sec'],
+                          r['p50_us'], r['p99_us'],
+                          r['peak_bytes_per_gesture'],
+                          r['retained_bytes_per_gesture'],
+                          r['gc_collections']))
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless gesture benchmark')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--target', choices=list(TARGETS), action='append')
+    parser.add_argument('--gesture', choices=list(GESTURES), action='append')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='deliver moves once per frame, if supported')
+    parser.add_argument('--shapes', type=int, default=1,
+                        help='number of shapes on the GestureCanvas')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='save a Chrome trace of the targets that ' +
+                        'support tracing')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a touch recording, after any ' +
+                        '--gesture')
+    args = parser.parse_args()
+    tracer = GestureTracer() if args.trace else None
+    gestures = args.gesture or list(GESTURES)
+    size = (WIDTH, HEIGHT)
+    if args.replay:
+        recording = TouchRecording.load(args.replay)
+        GESTURES['replay'] = replay(recording)
+        gestures = (args.gesture or []) + ['replay']
+        size = recording.size
+    rows = []
+    for target in args.target or TARGETS:
+        widget = make_target(target, args.coalesce, args.shapes)
+        widget.size = size
+        if tracer is not None and hasattr(widget, 'trace'):
+            widget.trace(tracer)
+        for gesture in gestures:
+            rows.append((target, gesture,
+                         run(widget, GESTURES[gesture], args.repeat)))
+    report(rows)
+    if tracer is not None:
+        tracer.save(args.trace)
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,112 @@
-from kivy.graphics import Color, Rectangle, Line
-from kivy.graphics import PushMatrix, PopMatrix, Rotate, Quad
+from kivy.graphics import Color, Line
+from kivy.graphics import PushMatrix, PopMatrix, Quad
+from kivy.graphics import MatrixInstruction, InstructionGroup
 from kivy.graphics.transformation import Matrix
+from kivy.clock import Clock
 from kivy.metrics import Metrics
+from kivy.properties import NumericProperty, OptionProperty, ColorProperty,\
+    BooleanProperty
 from kivy.utils import platform
-from math import sqrt, cos, sin, pi, radians
+from math import sqrt, radians, ceil
 from gestures4kivy import CommonGestures
+from spatialgrid import SpatialGrid
+from shapegeometry import make_geometry
+from gesturebackground import GestureBackground
 
-### Move an item on a canvas
+### A shape on the canvas
 ###################################################
 
-class GestureCanvas(CommonGestures):
+class Shape:
+    # A square centered on the origin, placed on the canvas by an affine
+    # matrix. Gestures compose into the matrix and the GPU applies it,
+    # the vertices are never rewritten.
+    def __init__(self, index, center_x, center_y, edge):
+        self.index = index    # drawing order, higher is on top
+        self.half = edge/2
+        h = self.half
+        self.transform = MatrixInstruction()
+        self.group = InstructionGroup()
+        self.group.add(PushMatrix())
+        self.group.add(self.transform)
+        self.quad = Quad(points = [-h, -h, h, -h, h, h, -h, h])
+        self.group.add(self.quad)
+        self.group.add(PopMatrix())
+        self.place(center_x, center_y)
+
+    def place(self, center_x, center_y):
+        matrix = Matrix().translate(center_x, center_y, 0)
+        self.set_matrix(matrix, self.corners(matrix))
+
+    def resize(self, edge):
+        # Only at a layout, the matrix is not changed
+        self.half = h = edge/2
+        self.quad.points = [-h, -h, h, -h, h, h, -h, h]
+
+    def set_matrix(self, matrix, corners):
+        # corners are the result of self.corners(matrix)
+        self.matrix = matrix
+        self.transform.matrix = matrix
+        self.box_x, self.box_y = corners
+
+    def corners(self, matrix):
+        # The vertices in Window coordinates, if placed by matrix
+        h = self.half
+        box_x = []
+        box_y = []
+        for lx, ly in ((-h, -h), (h, -h), (h, h), (-h, h)):
+            x, y, z = matrix.transform_point(lx, ly, 0)
+            box_x.append(x)
+            box_y.append(y)
+        return box_x, box_y
+
+    def bbox(self):
+        return (min(self.box_x), min(self.box_y),
+                max(self.box_x), max(self.box_y))
+
+### Move items on a canvas
+###################################################
+
+class GestureCanvas(GestureBackground, CommonGestures):
     # The CommonGestures class is derived from Widget,
     # for a canvas only operations inherit only from CommonGestures.
+
+    background_color = ColorProperty([1, 1, 1, 1])
+
+    # The number of shapes, laid out in a grid when the size changes.
+    shape_count = NumericProperty(1)
+    # Hit tests use NumPy arrays if available, 'auto', or as specified.
+    geometry_backend = OptionProperty('auto',
+                                      options=['auto', 'numpy', 'python'])
+    # If True, the drags, zooms, and rotates of a shape within a frame are
+    # composed into one matrix, and applied at the next frame with one
+    # inside test and one draw_box(). The frame's moves are kept or
+    # rejected together.
+    coalesce_moves = BooleanProperty(False)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.total_scale = 1
-    
+        self.shapes = []
+        self.grid = SpatialGrid(Metrics.dpi)
+        self.geometry = make_geometry(self.geometry_backend)
+        self.visual_fb = False
+        self.restore_matrices = None    # from set_state()
+        self.pending = None   # (shape, delta, x, y) for the next frame
+        self.apply_trigger = Clock.create_trigger(self.apply_pending)
+        # The instructions are created once, draw_box() updates them.
+        with self.canvas:
+            Color(1,0,0) # red
+        # Shapes are drawn here, then the feedback on top
+        with self.canvas.after:
+            # blue, transparent when there is no visual feedback
+            self.feedback_color = Color(0,0,1,0)
+            self.feedback = Line(circle=(0, 0, Metrics.dpi / 3), width = 4)
+
     ############# Gestures
 
     def cgb_select(self, touch, focus_x, focus_y, long_press):
-        if long_press and self.inside_box(focus_x, focus_y):
+        if long_press and self.shape_at(focus_x, focus_y):
             self.visual_feedback(True, focus_x, focus_y)
-    
+
     def cgb_long_press_end(self, touch, focus_x, focus_y):
         self.visual_feedback(False, focus_x, focus_y)
 
@@ -37,51 +122,46 @@ class GestureCanvas(CommonGestures):
     ############ Behaviors
 
     def zoom_box(self, delta_scale, x , y):
-        if self.inside_box(x, y):
-            px = x + self.x
-            py = y + self.y
-            new_x = []
-            new_y = []
-            for ox, oy, in zip(self.box_x, self.box_y):
-                qx = px + delta_scale * (ox - px)
-                qy = py + delta_scale * (oy - py)
-                new_x.append(qx)
-                new_y.append(qy)
-            if self.box_inside_widget(new_x, new_y):
-                self.total_scale *= delta_scale
-                self.box_x = new_x
-                self.box_y = new_y
-                self.draw_box(x,y)
+        self.transform_box(Matrix().scale(delta_scale, delta_scale, 1), x, y)
 
     def rotate_box(self, angle_delta, x, y):
-        if self.inside_box(x, y):
-            px = x + self.x
-            py = y + self.y
-            new_x = []
-            new_y = []
-            angle = radians(angle_delta)
-            for ox, oy, in zip(self.box_x, self.box_y):
-                qx = px + cos(angle) * (ox - px) - sin(angle) * (oy - py)
-                qy = py + sin(angle) * (ox - px) + cos(angle) * (oy - py)
-                new_x.append(qx)
-                new_y.append(qy)
-            if self.box_inside_widget(new_x, new_y):
-                self.box_x = new_x
-                self.box_y = new_y
-                self.draw_box(x,y)
+        self.transform_box(Matrix().rotate(radians(angle_delta), 0, 0, 1),
+                           x, y)
 
     def move_box(self, x, y, delta_x, delta_y):
-        if self.inside_box(x, y):
-            new_x = []
-            new_y = []
-            for ox, oy, in zip(self.box_x, self.box_y):
-                qx = ox + delta_x
-                qy = oy + delta_y
-                new_x.append(qx)
-                new_y.append(qy)
-            if self.box_inside_widget(new_x, new_y):
-                self.box_x = new_x
-                self.box_y = new_y
+        self.apply_box(Matrix().translate(delta_x, delta_y, 0), x, y)
+
+    def transform_box(self, delta, x, y):
+        # Apply delta about the widget point x, y
+        px = x + self.x
+        py = y + self.y
+        about = Matrix().translate(px, py, 0).multiply(
+            delta.multiply(Matrix().translate(-px, -py, 0)))
+        self.apply_box(about, x, y)
+
+    def apply_box(self, delta, x, y):
+        # Apply delta to the shape at the widget point x, y, now or with
+        # coalesce_moves at the next frame.
+        if self.pending:
+            # The shape has not moved since the frame's first delta,
+            # the later deltas are for the same shape.
+            shape, pending, px, py = self.pending
+            self.pending = (shape, delta.multiply(pending), x, y)
+            return
+        shape = self.shape_at(x, y)
+        if not shape:
+            return
+        if self.coalesce_moves:
+            self.pending = (shape, delta, x, y)
+            self.apply_trigger()
+        elif self.compose(shape, delta):
+            self.draw_box(x,y)
+
+    def apply_pending(self, *args):
+        if self.pending:
+            shape, delta, x, y = self.pending
+            self.pending = None
+            if self.compose(shape, delta):
                 self.draw_box(x,y)
 
     def visual_feedback(self, yes, x, y):
@@ -89,73 +169,157 @@ class GestureCanvas(CommonGestures):
         self.visual_fb = yes and mobile
         self.draw_box(x,y)
 
+    ############ Scene
+
+    def add_shape(self, center_x, center_y, edge):
+        # center in Window coordinates
+        shape = Shape(len(self.shapes), center_x, center_y, edge)
+        self.canvas.add(shape.group)
+        self.shapes.append(shape)
+        self.geometry.append(shape.box_x, shape.box_y)
+        self.grid.insert(shape.index, *shape.bbox())
+        return shape
+
+    def move_shape(self, center_x, center_y, edge):
+        # Place the next shape, in index order, as add_shape() would.
+        # The grid must be cleared before the first.
+        shape = self.shapes[len(self.grid)]
+        if shape.half != edge/2:
+            shape.resize(edge)
+        shape.place(center_x, center_y)
+        self.geometry.set_shape(shape.index, shape.box_x, shape.box_y)
+        self.grid.insert(shape.index, *shape.bbox())
+        return shape
+
+    def compose(self, shape, delta):
+        # Apply delta after the shape's matrix, if the result stays
+        # inside the widget.
+        matrix = delta.multiply(shape.matrix)
+        corners = shape.corners(matrix)
+        self.geometry.set_shape(shape.index, *corners)
+        if self.box_inside_widget([shape.index]):
+            shape.set_matrix(matrix, corners)
+            self.grid.update(shape.index, *shape.bbox())
+            return True
+        self.geometry.set_shape(shape.index, shape.box_x, shape.box_y)
+        return False
+
+    def clear_shapes(self):
+        for shape in self.shapes:
+            self.canvas.remove(shape.group)
+        self.shapes = []
+        self.grid.clear()
+        self.geometry.clear()
+
+    ############ State
+
+    def get_state(self):
+        # Shape matrices relative to the widget
+        self.apply_pending()
+        origin = Matrix().translate(-self.x, -self.y, 0)
+        return {'shape_count': int(self.shape_count),
+                'matrices': [origin.multiply(shape.matrix).get()
+                             for shape in self.shapes]}
+
+    def set_state(self, state):
+        self.shape_count = state['shape_count']
+        self.restore_matrices = state['matrices']
+        self.restore_shapes()
+
+    def restore_shapes(self):
+        # Place the shapes as saved, once the widget is large enough to
+        # hold all of them.
+        matrices = self.restore_matrices
+        if not matrices or len(matrices) != len(self.shapes):
+            return
+        origin = Matrix().translate(self.x, self.y, 0)
+        placed = []
+        for shape, flat in zip(self.shapes, matrices):
+            matrix = Matrix()
+            matrix.set(flat=flat)
+            matrix = origin.multiply(matrix)
+            corners = shape.corners(matrix)
+            self.geometry.set_shape(shape.index, *corners)
+            placed.append((shape, matrix, corners))
+        # All the shapes in one call
+        if not self.box_inside_widget(range(len(self.shapes))):
+            for shape in self.shapes:
+                self.geometry.set_shape(shape.index, shape.box_x, shape.box_y)
+            return
+        for shape, matrix, corners in placed:
+            shape.set_matrix(matrix, corners)
+            self.grid.update(shape.index, *shape.bbox())
+        self.restore_matrices = None
+
     ############ Utilities
 
-    # https://math.stackexchange.com/questions/190111/how-to-check-if-a-point-is-inside-a-rectangle
-    def inside_box(self,x,y):
+    def shape_at(self, x, y):
+        # The top shape containing the widget point x, y, or None.
+        # Only the shapes in the grid cell at x, y are tested.
         x += self.x
         y += self.y
-        xl = self.box_x[1:] + self.box_x[:1]  
-        yl = self.box_y[1:] + self.box_y[:1]  
-        a = []
-        b = []
-        for xe, ye, xn, yn in zip(self.box_x,self.box_y,xl,yl):
-            a.append(sqrt((xe-xn)**2 + (ye-yn)**2))
-            b.append(sqrt((xe-x)**2 + (ye-y)**2))
-        bl = b[1:] + b[:1]
-        u = []
-        for ae, be, bn in zip(a, b, bl):
-            u.append((ae + be + bn) / 2)
-        A = 0
-        for ue, ae, be, bn in zip(u, a, b, bl):
-            A += sqrt(ue * (ue - ae) * (ue - be) * (ue - bn))
-        A -= 0.00000001 # allow degraded precision
-        Aref = (self.box_edge * self.total_scale) **2
-        return A <= Aref and A > 0
-
-    def box_inside_widget(self, box_x, box_y):
-        if min(box_x) >= self.x and\
-           min(box_y) >= self.y and\
-           max(box_x) <= self.x + self.width and\
-           max(box_y) <= self.y + self.height:
-            return True
-        return False
+        candidates = self.grid.query_point(x, y)
+        if candidates:
+            hits = self.geometry.hits(candidates, x, y)
+            if hits:
+                return self.shapes[max(hits)]
+        return None
+
+    def box_inside_widget(self, indices):
+        # True if the geometry of all these shapes is inside the widget
+        return all(self.geometry.inside_rect(indices, self.x, self.y,
+                                             self.right, self.top))
 
     def on_size(self, *args):
         self.visual_fb = False
-        self.box_edge = Metrics.dpi
-        # Window coordinates
-        midpointbox = self.box_edge/2
-        midpointwidget_x = self.width/2 + self.x
-        midpointwidget_y = self.height/2 + self.y
-        self.box_x = [midpointwidget_x - midpointbox,
-                      midpointwidget_x + midpointbox,
-                      midpointwidget_x + midpointbox,
-                      midpointwidget_x - midpointbox]
-        self.box_y = [midpointwidget_y - midpointbox,
-                      midpointwidget_y - midpointbox,
-                      midpointwidget_y + midpointbox,
-                      midpointwidget_y + midpointbox]
+        # The layout replaces the shape placements
+        self.pending = None
+        self.apply_trigger.cancel()
+        # Lay out the shapes in a grid of cells, one shape per cell
+        count = max(1, int(self.shape_count))
+        cols = max(1, ceil(sqrt(count * self.width / max(1, self.height))))
+        rows = ceil(count / cols)
+        cell_w = self.width / cols
+        cell_h = self.height / rows
+        if count == 1:
+            edge = Metrics.dpi
+        else:
+            edge = min(Metrics.dpi, 0.6 * min(cell_w, cell_h))
+        if len(self.shapes) == count == len(self.geometry):
+            # Same shapes, move them, their instructions are reused
+            place = self.move_shape
+        else:
+            self.clear_shapes()
+            place = self.add_shape
+        self.grid.clear()
+        self.grid.cell_size = max(1, 1.5 * edge)
+        for i in range(count):
+            row, col = divmod(i, cols)
+            if count == 1:
+                # Window coordinates
+                cx = self.width/2 + self.x
+                cy = self.height/2 + self.y
+            else:
+                cx = self.x + (col + 0.5) * cell_w
+                cy = self.y + (row + 0.5) * cell_h
+            place(cx, cy, edge)
+        self.restore_shapes()
         self.draw_box(0,0)
-        
-    def draw_box(self, x, y):
-        self.canvas.clear()
-        with self.canvas:
-            Color(1,1,1) # white
-            Rectangle(pos = self.pos, size= self.size)
-            Color(1,0,0) # red
-            mergedxy = self.box_x + self.box_y
-            mergedxy[::2] = self.box_x
-            mergedxy[1::2] = self.box_y
-            Quad(points = mergedxy)
-            
-            if self.visual_fb:
-                Color(0,0,1) # blue
-                Line(circle=(self.x + x, self.y + y, Metrics.dpi / 3),
-                     width = 4)
 
+    def on_shape_count(self, *args):
+        if hasattr(self, 'shapes'):
+            self.on_size()
 
+    def on_geometry_backend(self, *args):
+        if hasattr(self, 'geometry'):
+            self.geometry = make_geometry(self.geometry_backend)
+            self.on_size()
 
-
-            
-                
+    def draw_box(self, x, y):
+        # The shapes update their own Quad, the background follows
+        # the widget, update the feedback
+        if self.visual_fb:
+            self.feedback.circle = (self.x + x, self.y + y, Metrics.dpi / 3)
+            self.feedback_color.a = 1
+        else:
+            self.feedback_color.a = 0
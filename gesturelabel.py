@@ -1,21 +1,36 @@
 from kivy.uix.label import Label
-from kivy.graphics import Color, Rectangle
+from kivy.properties import BooleanProperty
 from kivy.utils import platform
 from gestures4kivy import CommonGestures
+from labeltext import LabelText
+from glyphreadout import GlyphReadout
+from gesturebackground import GestureBackground
 
-### A gesture sensitive Label
+### Gesture text
 ###################################################
+# Shows each gesture in the `text` of label_widget(), by default the
+# widget itself, on a GestureBackground.
+# If `throttle_text` the text is shown at most once per frame,
+# see labeltext.py
+
+class GestureText(GestureBackground):
+
+    throttle_text = BooleanProperty(True)
+
+    def __init__(self, **args):
+        self._label_text = LabelText(self.label_widget())
+        super().__init__(**args)
 
-class GestureLabel(Label, CommonGestures):
+    def label_widget(self):
+        # Called before the widget's __init__ continues
+        return self
 
-    def on_size(self, *args):
-        self.canvas.before.clear()
-        with self.canvas.before:
-            Color(0.5, 0.5, 0.5, 1)
-            Rectangle(pos=self.pos, size=self.size)
-    
-    def set_label(self, text, x, y):
-        self.text = '{}\nFocus x={} y={}'.format(text,round(x),round(y))
+    def on_throttle_text(self, instance, value):
+        self._label_text.throttle = value
+
+    def set_label(self, text, x, y, details=''):
+        self._label_text.set('{}\nFocus x={} y={}{}'.format(text, round(x),
+                                                            round(y), details))
 
     def cgb_primary(self, touch, focus_x, focus_y):
         self.set_label('Primary Event',focus_x, focus_y)
@@ -33,32 +48,44 @@ class GestureLabel(Label, CommonGestures):
         self.set_label('Drag',focus_x, focus_y)
 
     def cgb_scroll(self, touch, focus_x, focus_y, delta_y, velocity):
-        self.set_label('Scroll',focus_x, focus_y)
-        self.text += '\ndelta y={}'.format(round(delta_y))
-        self.text += '\nvelocity={}'.format(round(velocity))
+        self.set_label('Scroll',focus_x, focus_y,
+                       '\ndelta y={}\nvelocity={}'.format(round(delta_y),
+                                                          round(velocity)))
 
     def cgb_pan(self, touch, focus_x, focus_y, delta_y, velocity):
         if platform in ['android', 'ios']:
             # Can disambiguate between swipe and pan
-            self.set_label('Pan',focus_x, focus_y)
-            self.text += '\ndelta y={}'.format(round(delta_y))
-            self.text += '\nvelocity={}'.format(round(velocity))
+            self.set_label('Pan',focus_x, focus_y,
+                           '\ndelta y={}\nvelocity={}'.format(round(delta_y),
+                                                              round(velocity)))
 
     def cgb_zoom(self, touch0, touch1, focus_x, focus_y, delta_scale):
-        self.set_label('Zoom',focus_x, focus_y)
         fmt = round(delta_scale * 1000)/1000
-        self.text += '\ndelta scale={}'.format(fmt)
-        
+        self.set_label('Zoom',focus_x, focus_y,
+                       '\ndelta scale={}'.format(fmt))
 
     def cgb_rotate(self, touch0, touch1, focus_x, focus_y, delta_angle):
+        fmt = round(delta_angle * 1000)/1000
         if platform in ['android', 'ios']:
-            self.text += '{}\nFocus x={} y={}'.format('\n\nRotate',
-                                                      round(focus_x),
-                                                      round(focus_y))
+            # Follows the zoom text
+            self._label_text.set(
+                '{}\n\nRotate\nFocus x={} y={}\ndelta angle={}'.format(
+                    self._label_text.text, round(focus_x), round(focus_y), fmt))
         else:
-            self.set_label('Rotate',focus_x, focus_y)
-        fmt = round(delta_angle * 1000)/1000
-        self.text += '\ndelta angle={}'.format(fmt)
+            self.set_label('Rotate',focus_x, focus_y,
+                           '\ndelta angle={}'.format(fmt))
 
-        
 
+### A gesture sensitive Label
+###################################################
+
+class GestureLabel(GestureText, Label, CommonGestures):
+    pass
+
+### A gesture sensitive GlyphReadout
+###################################################
+# The same text as GestureLabel, without rendering a texture per change,
+# see glyphreadout.py
+
+class GestureReadout(GestureText, GlyphReadout, CommonGestures):
+    pass
@@ -0,0 +1,62 @@
+from collections import deque
+from time import perf_counter
+import json
+
+### Gesture tracing
+###################################################
+# A ring buffer of trace events, the most recent `capacity` are kept.
+# Exported as Chrome trace JSON, open it in chrome://tracing or
+# https://ui.perfetto.dev
+#
+# Attach to a CommonGestures (save.py) instance with widget.trace(tracer),
+# detach with widget.trace(None).
+#
+# Times are perf_counter() seconds, each traced widget is a lane.
+
+class GestureTracer:
+
+    def __init__(self, capacity=10000):
+        self.events = deque(maxlen=capacity)
+        self._lanes = {}    # lane name -> tid
+
+    def complete(self, name, category, lane, start, duration, args=None):
+        self.events.append(('X', name, category, self._tid(lane),
+                            start, duration, args))
+
+    def instant(self, name, category, lane, time, args=None):
+        self.events.append(('i', name, category, self._tid(lane),
+                            time, 0, args))
+
+    def clear(self):
+        self.events.clear()
+
+    def __len__(self):
+        return len(self.events)
+
+    def chrome_trace(self):
+        # The events as a Chrome trace dict, times in microseconds
+        origin = self.events[0][4] if self.events else perf_counter()
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+                  'args': {'name': lane}}
+                 for lane, tid in self._lanes.items()]
+        for ph, name, category, tid, time, duration, args in self.events:
+            event = {'name': name, 'cat': category, 'ph': ph, 'pid': 1,
+                     'tid': tid, 'ts': (time - origin) * 1e6}
+            if ph == 'X':
+                event['dur'] = duration * 1e6
+            else:
+                event['s'] = 't'
+            if args:
+                event['args'] = args
+            trace.append(event)
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def _tid(self, lane):
+        tid = self._lanes.get(lane)
+        if tid is None:
+            tid = self._lanes[lane] = len(self._lanes) + 1
+        return tid
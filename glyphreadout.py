@@ -0,0 +1,136 @@
+from kivy.uix.widget import Widget
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Mesh
+from kivy.properties import StringProperty, NumericProperty, OptionProperty,\
+    ColorProperty
+
+### A text readout drawn from a glyph atlas
+###################################################
+# For text that changes at touch event rate, such as gesture telemetry.
+# The printable ASCII characters are rendered once, per font and size,
+# into an atlas texture shared by every GlyphReadout. Text is drawn as
+# one textured quad per character in a single Mesh, so a change of text
+# updates only the Mesh vertices, there is no text rendering.
+# If the line lengths are unchanged, as when only digits change, only
+# the texture coordinates of the changed characters are updated.
+#
+# The font must be monospaced, each glyph is one cell of the atlas.
+# Characters outside the atlas are drawn as '?'.
+#
+# Lines are centered in the widget as a block, and aligned within the
+# block by `halign`, as a Label without `text_size` draws them. A
+# GlyphReadout can replace a Label that only displays `text`.
+
+CHARSET = ''.join(chr(c) for c in range(32, 127))
+
+_ATLASES = {}    # (font_name, font_size) -> (texture, cell width, height)
+
+def glyph_atlas(font_name, font_size):
+    key = (font_name, font_size)
+    atlas = _ATLASES.get(key)
+    if atlas is None:
+        label = CoreLabel(text=CHARSET, font_name=font_name,
+                          font_size=font_size)
+        label.refresh()
+        texture = label.texture
+        atlas = _ATLASES[key] = (texture, texture.width / len(CHARSET),
+                                 texture.height)
+    return atlas
+
+
+class GlyphReadout(Widget):
+
+    text = StringProperty('')
+    font_name = StringProperty('RobotoMono-Regular')
+    font_size = NumericProperty('15sp')
+    color = ColorProperty([1, 1, 1, 1])
+    halign = OptionProperty('left', options=['left', 'center', 'right'])
+
+    def __init__(self, **args):
+        super().__init__(**args)
+        with self.canvas:
+            self._color = Color(rgba=self.color)
+            self._mesh = Mesh(mode='triangles')
+        self._indices = []
+        self._vertices = []
+        self._chars = ''          # the text shown, without newlines
+        self._shape = None        # its line lengths
+        self._atlas()
+        self.fbind('text', self._update)
+        self.fbind('pos', self._layout)
+        self.fbind('size', self._layout)
+        self.fbind('halign', self._layout)
+        self.fbind('font_name', self._atlas)
+        self.fbind('font_size', self._atlas)
+
+    def on_color(self, instance, value):
+        if hasattr(self, '_color'):
+            self._color.rgba = value
+
+    def _atlas(self, *args):
+        texture, self._cell_width, self._cell_height =\
+            glyph_atlas(self.font_name, self.font_size)
+        self._mesh.texture = texture
+        # char -> u of its left and right edges, v of the bottom and top
+        u0, v0, u1, v1, u2, v2, u3, v3 = texture.tex_coords
+        du = (u1 - u0) / len(CHARSET)
+        self._glyphs = {char: (u0 + i * du, u0 + (i + 1) * du)
+                        for i, char in enumerate(CHARSET)}
+        self._v0 = v0
+        self._v1 = v2
+        self._layout()
+
+    def _update(self, *args):
+        lines = self.text.split('\n')
+        shape = [len(line) for line in lines]
+        if shape != self._shape:
+            self._layout()
+            return
+        chars = ''.join(lines)
+        glyphs = self._glyphs
+        unknown = glyphs['?']
+        vertices = self._vertices
+        i = 0
+        for old, new in zip(self._chars, chars):
+            if old != new:
+                u0, u1 = glyphs.get(new, unknown)
+                vertices[i + 2] = vertices[i + 14] = u0
+                vertices[i + 6] = vertices[i + 10] = u1
+            i += 16
+        self._chars = chars
+        self._mesh.vertices = vertices
+
+    def _layout(self, *args):
+        lines = self.text.split('\n')
+        cw = self._cell_width
+        ch = self._cell_height
+        width = max(len(line) for line in lines) * cw
+        left = round(self.center_x - width / 2)
+        top = round(self.center_y + len(lines) * ch / 2)
+        glyphs = self._glyphs
+        unknown = glyphs['?']
+        v0, v1 = self._v0, self._v1
+        vertices = []
+        for row, line in enumerate(lines):
+            x = left
+            if self.halign == 'center':
+                x += round((width - len(line) * cw) / 2)
+            elif self.halign == 'right':
+                x += round(width - len(line) * cw)
+            y0 = top - (row + 1) * ch
+            y1 = y0 + ch
+            for char in line:
+                u0, u1 = glyphs.get(char, unknown)
+                vertices += (x, y0, u0, v0, x + cw, y0, u1, v0,
+                             x + cw, y1, u1, v1, x, y1, u0, v1)
+                x += cw
+        self._vertices = vertices
+        self._chars = ''.join(lines)
+        self._shape = [len(line) for line in lines]
+        quads = len(vertices) // 16
+        if quads * 6 > len(self._indices):
+            for q in range(len(self._indices) // 6, quads):
+                k = q * 4
+                self._indices.extend((k, k + 1, k + 2, k, k + 2, k + 3))
+        self._mesh.vertices = vertices
+        self._mesh.indices = self._indices[:quads * 6]
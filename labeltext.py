@@ -0,0 +1,31 @@
+from kivy.clock import Clock
+
+### Label text for high rate updates
+###################################################
+# Sets a Label's text only when it changes. If `throttle` the text is
+# assigned at most once per frame, the last text set in the frame is
+# shown. Each assignment dispatches `text` and re-renders the texture,
+# so a readout updated by every touch event costs one render per frame.
+#
+# `text` is the latest text, whether or not it is shown yet.
+
+class LabelText:
+
+    def __init__(self, label, throttle=True):
+        self.label = label
+        self.throttle = throttle
+        self.text = label.text
+        self._assign_trigger = Clock.create_trigger(self._assign)
+
+    def set(self, text):
+        if text == self.text:
+            return
+        self.text = text
+        if self.throttle:
+            self._assign_trigger()
+        else:
+            self._assign()
+
+    def _assign(self, *args):
+        self._assign_trigger.cancel()
+        self.label.text = self.text
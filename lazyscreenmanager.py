@@ -0,0 +1,98 @@
+from kivy.uix.screenmanager import ScreenManager
+from kivy.clock import Clock
+from kivy.properties import BooleanProperty, NumericProperty
+
+### A ScreenManager that creates Screens when they are first shown
+###################################################
+# Screens are registered as factories, `factory(name=name)` returns the
+# Screen. A Screen is created the first time it becomes `current`, so
+# the time to the first frame depends only on the first Screen.
+#
+# If `prefetch` the neighbours of the current Screen, in registration
+# order, are created `prefetch_delay` seconds after it is shown. One
+# Screen per frame, so a transition is not interrupted for long.
+#
+# If not `lazy` Screens are created when they are registered.
+#
+# If `window` is not None only the current Screen and `window` Screens
+# on each side of it stay resident. Other Screens are removed once the
+# transition ends, after saving `screen.get_state()` if the Screen has
+# it. When the Screen is created again `screen.set_state(state)` restores
+# it. Memory then depends on the window, not the number of Screens.
+
+class LazyScreenManager(ScreenManager):
+
+    lazy = BooleanProperty(True)
+    prefetch = BooleanProperty(False)
+    prefetch_delay = NumericProperty(0.5)
+    window = NumericProperty(None, allownone=True)
+
+    def __init__(self, **args):
+        super().__init__(**args)
+        self.factories = {}     # name -> factory, in registration order
+        self.states = {}        # name -> state of an evicted Screen
+        self._settle_event = None
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+        if not self.lazy:
+            self.create_screen(name)
+
+    def create_screen(self, name):
+        # The Screen with this name, created if it was registered
+        if not self.has_screen(name) and name in self.factories:
+            screen = self.factories[name](name=name)
+            if name in self.states:
+                screen.set_state(self.states.pop(name))
+            self.add_widget(screen)
+
+    def evict_screen(self, name):
+        # Remove the Screen, keeping its state
+        if not self.has_screen(name):
+            return
+        screen = super().get_screen(name)
+        if hasattr(screen, 'get_state'):
+            self.states[name] = screen.get_state()
+        self.remove_widget(screen)
+
+    def get_screen(self, name):
+        self.create_screen(name)
+        return super().get_screen(name)
+
+    def neighbours(self, name, distance=1):
+        names = list(self.factories)
+        if name not in names:
+            return []
+        i = names.index(name)
+        return names[max(0, i - distance):i] + names[i + 1:i + 1 + distance]
+
+    def on_current(self, instance, value):
+        super().on_current(instance, value)
+        if value is None or (not self.prefetch and self.window is None):
+            return
+        if self._settle_event:
+            self._settle_event.cancel()
+        self._settle_event = Clock.schedule_once(
+            lambda dt: self._settle(value), self.prefetch_delay)
+
+    def _settle(self, name):
+        # After the transition to name, evict then prefetch
+        if self.transition.is_active:
+            self._settle_event = Clock.schedule_once(
+                lambda dt: self._settle(name), self.prefetch_delay)
+            return
+        if self.window is not None and name == self.current:
+            keep = set(self.neighbours(name, int(self.window)))
+            keep.add(name)
+            for screen_name in self.screen_names:
+                if screen_name not in keep and screen_name in self.factories:
+                    self.evict_screen(screen_name)
+        if self.prefetch:
+            self._prefetch(self.neighbours(name))
+
+    def _prefetch(self, names):
+        names = [n for n in names if not self.has_screen(n)]
+        if names:
+            self.create_screen(names[0])
+            self._settle_event = Clock.schedule_once(
+                lambda dt: self._prefetch(names[1:]))
@@ -1,5 +1,5 @@
 from kivy.app import App
-from kivy.uix.screenmanager import ScreenManager
+from lazyscreenmanager import LazyScreenManager
 from kivy.utils import platform
 from kivy.core.window import Window
 from screens import Screen1, Screen2, Screen3, Screen4, Screen5
@@ -13,14 +13,13 @@ class MyApp(App):
     def build(self):
         if platform == 'android':
             Window.bind(on_keyboard = self.inhibit_android_back_gesture)
-        self.sm = ScreenManager()
-        self.screens = [Screen1(name='1'),
-                        Screen2(name='2'),
-                        Screen3(name='3'),
-                        Screen4(name='4'),
-                        Screen5(name='5')]
-        for s in self.screens:
-            self.sm.add_widget(s)
+        # Screens are created when first shown, neighbours are prefetched,
+        # and screens further away are evicted with their state saved.
+        self.sm = LazyScreenManager(prefetch = True, window = 1)
+        self.screens = [Screen1, Screen2, Screen3, Screen4, Screen5]
+        for i, s in enumerate(self.screens):
+            self.sm.register(str(i + 1), s)
+        self.sm.current = '1'
         return self.sm
 
     # assumes screen names '1','2','3'....
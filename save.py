@@ -24,26 +24,158 @@ from kivy.uix.widget import Widget
 from kivy.clock import Clock
 from kivy.metrics import Metrics
 from kivy.config import Config
+from kivy.properties import BooleanProperty, OptionProperty
 from kivy.utils import platform
-from functools import partial
-from time import time
-from math import sqrt
+from time import time, perf_counter
+from math import sqrt, atan2, degrees
+from weakref import WeakSet
+from velocity import VelocityEstimator
 
 # This is a workaround for a SDL2 issue described below.
 PREVIOUS_PAGE_START = 0
 
+# Gesture states, each state indexes the handler tables in CommonGestures.
+(NONE, DONT_KNOW, RIGHT, DISAMBIGUATE, MOVE, SWIPE, LONG_PRESSED,
+ LONG_PRESS_MOVE, SCALE, WHEEL, POTENTIAL_PAGE) = range(11)
+STATE_COUNT = 11
+STATE_NAMES = ('none', 'dont_know', 'right', 'disambiguate', 'move', 'swipe',
+               'long_pressed', 'long_press_move', 'scale', 'wheel',
+               'potential_page')
+
+def _state_table(handlers, default):
+    # A tuple of handlers indexed by state, default for unlisted states
+    return tuple(handlers.get(state, default) for state in range(STATE_COUNT))
+
+### CTRL SHIFT key detect
+# One pair of Window bindings shared by every instance, made by the first
+# desktop instance. A key event costs the same for any number of widgets,
+# and the bindings do not keep any widget alive.
+
+class _ModifierKeys:
+
+    def __init__(self):
+        self.ctrl = False
+        self.shift = False
+        self._bound = False
+
+    def bind(self):
+        if not self._bound:
+            Window.bind(on_key_down=self._key_down, on_key_up=self._key_up)
+            self._bound = True
+
+    def _key_down(self, window, key, scancode, codepoint, modifiers):
+        command_key = platform == 'macosx' and 'meta' in modifiers
+        if 'ctrl' in modifiers or command_key:
+            self.ctrl = True
+        if 'shift' in modifiers:
+            self.shift = True
+
+    def _key_up(self, *args):
+        self.ctrl = False
+        self.shift = False
+
+MODIFIER_KEYS = _ModifierKeys()
+
+### Pointers
+# Each touch of a gesture has a _Pointer, in a dict keyed by touch.uid, so
+# a touch is found in constant time for any number of fingers. x, y is the
+# touch position saved at its last event, see the RelativeLayout note
+# below. ref_x, ref_y is the position at the last multi-touch update.
+
+class _Pointer:
+    __slots__ = ('touch', 'x', 'y', 'ref_x', 'ref_y')
+
+    def __init__(self, touch):
+        self.touch = touch
+        self.x, self.y = touch.pos
+        self.ref_x, self.ref_y = self.x, self.y
+
+### Gesture arbitration
+# When CommonGestures are nested, a touch is processed by one of them,
+# its owner, recorded in touch.ud so it is shared by every widget the
+# touch is dispatched to. One state machine and one set of Clock events
+# run per touch, for any depth of nesting.
+#
+# The innermost CommonGestures under the touch is the owner, unless an
+# outer one already has a gesture in progress. A gesture the owner does
+# not handle, a cg_* method it does not override, is passed to the
+# nearest enclosing CommonGestures that does. For example a swipe that
+# starts on a nested widget that only handles taps goes to the enclosing
+# widget that handles swipes.
+#
+# This applies only to this CommonGestures, as used by gesturebench.py.
+# The example app widgets use gestures4kivy, which does not arbitrate.
+#
+# A touch that lands outside a gesture in progress is not a separate
+# gesture, for example the second finger of a pinch that started on a
+# nested widget. The nearest CommonGestures enclosing both the gesture and
+# the new touch takes over the gesture's touches and owns the new one.
+# The gesture in progress ends, see _hand_over().
+
+_ACTIVE = WeakSet()    # the CommonGestures with a gesture in progress
+
+def _claim(widget, touch):
+    # True if widget is, or now becomes, the owner of touch
+    owner = touch.ud.get('cg_owner')
+    if owner is None:
+        owner = touch.ud['cg_owner'] = _owner_for(widget, touch)
+    return owner is widget
+
+def _owner_for(widget, touch):
+    # widget, or the CommonGestures that encloses it and the gestures
+    # in progress
+    if touch.is_mouse_scrolling:
+        return widget
+    for other in list(_ACTIVE):
+        if other is not widget:
+            common = _common_ancestor(widget, other)
+            if common is not None:
+                if common is not other:
+                    other._hand_over(common)
+                widget = common
+    return widget
+
+def _common_ancestor(a, b):
+    # The nearest CommonGestures enclosing both, or either if it encloses
+    # the other
+    enclosing = set()
+    while a is not None:
+        enclosing.add(a)
+        a = a.parent
+    while b is not None:
+        if b in enclosing and isinstance(b, CommonGestures):
+            return b
+        b = b.parent
+    return None
+
+def _handles(widget, name):
+    return getattr(type(widget), name) is not getattr(CommonGestures, name)
+
 
 class CommonGestures(Widget):
 
+    # If True, move and scale events are accumulated and delivered to
+    # cg_move_to(), cg_long_press_move_to(), and the multi-touch events
+    # cg_scale(), cg_rotate(), and cg_pan() once per frame.
+    # The samples since the previous delivery are in `coalesced_samples`.
+    coalesce_moves = BooleanProperty(False)
+
+    # The filter for move velocity, see VelocityEstimator.
+    velocity_filter = OptionProperty('least_squares',
+                                     options=['least_squares', 'exponential'])
+
     def __init__(self, **kwargs):
+        self._velocity_estimator = VelocityEstimator()
         super().__init__(**kwargs)
         self.mobile = platform == 'android' or platform == 'ios'
         if not self.mobile:
-            Window.bind(on_key_down=self._ctrl_key_down)
-            Window.bind(on_key_down=self._shift_key_down)
-            Window.bind(on_key_up=self._key_up)
-        self._CTRL = False
-        self._SHIFT = False
+            MODIFIER_KEYS.bind()
+        # A list of (touch, x, y, time), in widget coordinates, valid only
+        # for the duration of the callback. The list is reused, copy to keep.
+        self.coalesced_samples = []
+        self._flush_trigger = Clock.create_trigger(self._flush_moves)
+        self._recipients = {}    # cg_* name -> enclosing recipient or None
+        self._pointers = {}      # touch.uid -> _Pointer, in touch down order
         self._new_gesture()
         #### Sensitivity
         self._DOUBLE_TAP_TIME     = Config.getint('postproc',
@@ -52,6 +184,7 @@ class CommonGestures(Widget):
                                                   'double_tap_distance')
         self._LONG_PRESS          = 0.4                 # sec, convention
         self._MOVE_VELOCITY_SAMPLE = 0.2                # sec
+        self._velocity_estimator.window = self._MOVE_VELOCITY_SAMPLE
         self._SWIPE_TIME          = 0.3                 # sec 
         self._SWIPE_VELOCITY      = 6                   # inches/sec, heuristic
         if platform == 'android':
@@ -62,8 +195,17 @@ class CommonGestures(Widget):
                 
         self._WHEEL_SENSITIVITY   = 1.1                 # heuristic
         self._PAGE_FILTER         = 2.0                 # Hz, heuristic
-        self._persistent_pos = [(0,0),(0,0)]
         self._LONG_MOVE_THRESHOLD = self._DOUBLE_TAP_DISTANCE /2
+        # The long press and tap timers are created once, and armed by
+        # each touch down with the touch saved below, not allocated per touch.
+        self._long_press_trigger = Clock.create_trigger(self._long_press_event,
+                                                        self._LONG_PRESS)
+        self._single_tap_trigger = Clock.create_trigger(self._single_tap_event,
+                                                        self._DOUBLE_TAP_TIME)
+        self._press_touch = None
+        self._press_x = self._press_y = self._press_ox = self._press_oy = 0
+        self._tap_touch = None
+        self._tap_x = self._tap_y = 0
 
 
     #####################
@@ -78,222 +220,371 @@ class CommonGestures(Widget):
     # This is an issue for gestures with persistence, for example two touches.
     # So if we have a RelativeLayout we can't rely on the value in touch.pos .
     # So regardless of there being a RelativeLayout, we save each touch.pos
-    # in self._persistent_pos[] and use that when the current value is
-    # required. 
+    # in its _Pointer and use that when the current value is required.
     
     ### touch down ###
+    # Nested CommonGestures: each touch is processed by only one of them,
+    # see Gesture arbitration below. Children are offered the touch first,
+    # unless this widget has a gesture in progress, such as the first
+    # finger of a scale.
     def on_touch_down(self, touch):
-        if self.collide_point(touch.x, touch.y):
-            if len(self._touches) == 1 and touch.id == self._touches[0].id:
-                # Filter noise from Kivy, one touch.id touches down twice
-                pass
-            elif platform == 'ios' and 'mouse' in str(touch.id):
-                # Filter more noise from Kivy, extra mouse events
-                return super().on_touch_down(touch)
-            else:
-                self._touches.append(touch)
-            if touch.is_mouse_scrolling:
-                self._gesture_state = 'Wheel'
-                scale = self._WHEEL_SENSITIVITY
-                x, y = self._pos_to_widget(touch.x, touch.y)
-                if touch.button == 'scrollleft':
-                    self._gesture_state = 'PotentialPage'
-                    self.cg_shift_wheel(touch,1/scale, x, y)
-                elif touch.button == 'scrollright':
-                    self._gesture_state = 'PotentialPage'
-                    self.cg_shift_wheel(touch,scale, x, y)                
-                else: 
-                    self._gesture_state = 'Wheel'
-                    if touch.button == 'scrollup':
-                        scale = 1/scale
-                    if self._CTRL:
-                        self.cg_ctrl_wheel(touch,scale, x, y)
-                    elif self._SHIFT:
-                        self.cg_shift_wheel(touch,scale, x, y)
-                    else:
-                        self.cg_wheel(touch,scale, x, y)
-
-            elif len(self._touches) == 1:
-                if 'button' in touch.profile and touch.button == 'right':
-                    # Two finger tap or right click
-                    self._gesture_state = 'Right' 
+        if not self.collide_point(touch.x, touch.y):
+            return super().on_touch_down(touch)
+        if self._pointers and _claim(self, touch):
+            self._touch_down(touch)
+            return super().on_touch_down(touch)
+        result = super().on_touch_down(touch)
+        if _claim(self, touch):
+            self._touch_down(touch)
+        return result
+
+    def _touch_down(self, touch):
+        if self.coalesced_samples:
+            # deliver the moves before the new touch changes the gesture
+            self._flush_moves()
+        pointers = self._pointers
+        if len(pointers) == 1 and\
+           touch.id == next(iter(pointers.values())).touch.id:
+            # Filter noise from Kivy, one touch.id touches down twice
+            pass
+        elif platform == 'ios' and 'mouse' in str(touch.id):
+            # Filter more noise from Kivy, extra mouse events
+            return
+        else:
+            pointers[touch.uid] = _Pointer(touch)
+            _ACTIVE.add(self)
+        if touch.is_mouse_scrolling:
+            self._gesture_state = WHEEL
+            scale = self._WHEEL_SENSITIVITY
+            x, y = self._pos_to_widget(touch.x, touch.y)
+            if touch.button == 'scrollleft':
+                self._gesture_state = POTENTIAL_PAGE
+                self.cg_shift_wheel(touch,1/scale, x, y)
+            elif touch.button == 'scrollright':
+                self._gesture_state = POTENTIAL_PAGE
+                self.cg_shift_wheel(touch,scale, x, y)                
+            else: 
+                self._gesture_state = WHEEL
+                if touch.button == 'scrollup':
+                    scale = 1/scale
+                if MODIFIER_KEYS.ctrl:
+                    self.cg_ctrl_wheel(touch,scale, x, y)
+                elif MODIFIER_KEYS.shift:
+                    self.cg_shift_wheel(touch,scale, x, y)
                 else:
-                    self._gesture_state = 'Dont Know' 
-                    # schedule a posssible long press
-                    if not self._long_press_schedule:
-                        self._long_press_schedule =\
-                            Clock.schedule_once(partial(self._long_press_event,
-                                                        touch, touch.x, touch.y,
-                                                        touch.ox, touch.oy),
-                                                self._LONG_PRESS)
-                    # schedule a posssible tap 
-                    if not self._single_tap_schedule:
-                        self._single_tap_schedule =\
-                            Clock.schedule_once(partial(self._single_tap_event,
-                                                        touch ,
-                                                        touch.x, touch.y),
-                                                self._DOUBLE_TAP_TIME)
-
-                self._persistent_pos[0] = tuple(touch.pos)
-            elif len(self._touches) == 2:
-                self._gesture_state = 'Scale'
-                # If two fingers it cant be a long press, swipe or tap
-                self._not_long_press() 
-                self._not_single_tap()
-                self._persistent_pos[1] = tuple(touch.pos)
-                x, y = self._scale_midpoint()
-                self.cg_scale_start(self._touches[0],self._touches[1], x, y)
-
-        return super().on_touch_down(touch)
+                    self.cg_wheel(touch,scale, x, y)
+
+        elif len(pointers) == 1:
+            if 'button' in touch.profile and touch.button == 'right':
+                # Two finger tap or right click
+                self._gesture_state = RIGHT 
+            else:
+                self._gesture_state = DONT_KNOW 
+                # schedule a posssible long press
+                if not self._long_press_trigger.is_triggered:
+                    self._press_touch = touch
+                    self._press_x, self._press_y = touch.x, touch.y
+                    self._press_ox, self._press_oy = touch.ox, touch.oy
+                    self._long_press_trigger()
+                # schedule a posssible tap 
+                if not self._single_tap_trigger.is_triggered:
+                    self._tap_touch = touch
+                    self._tap_x, self._tap_y = touch.x, touch.y
+                    self._single_tap_trigger()
+
+        elif self._gesture_state == SCALE:
+            # Another finger joins the gesture, from its current position
+            # so the scale, angle, and centroid do not jump.
+            self._rebase_pointers()
+        elif len(pointers) >= 2:
+            self._gesture_state = SCALE
+            # If two fingers it cant be a long press, swipe or tap
+            self._not_long_press() 
+            self._not_single_tap()
+            self._rebase_pointers()
+            touch0, touch1 = self._scale_touches()
+            x, y = self._centroid()
+            self.cg_scale_start(touch0, touch1, x, y)
 
     ### touch move ###
     def on_touch_move(self, touch):
-        if touch in self._touches and self.collide_point(touch.x, touch.y):
+        pointer = self._pointers.get(touch.uid)
+        if pointer is not None and self.collide_point(touch.x, touch.y):
+            pointer.x, pointer.y = touch.pos
             # Old Android screens give noisy touch events
             # which can kill a long press.
             if (not self.mobile and (touch.dx or touch.dy)) or\
-               (self.mobile and not self._long_press_schedule and\
+               (self.mobile and not self._long_press_trigger.is_triggered and\
                 (touch.dx or touch.dy)) or\
                (self.mobile and (abs(touch.dx) > self._LONG_MOVE_THRESHOLD or\
                             abs(touch.dy) > self._LONG_MOVE_THRESHOLD)):
                 # If moving it cant be a pending long press or tap
                 self._not_long_press()
                 self._not_single_tap() 
-                # State changes
-                if self._gesture_state == 'Long Pressed':
-                    self._gesture_state = 'Long Press Move'
-                    x, y = self._pos_to_widget(touch.ox, touch.oy)
-                    self._velocity_start(touch)
-                    self.cg_long_press_move_start(touch, x, y)
-
-                elif self._gesture_state == 'Dont Know':
-                    self._gesture_state = 'Disambiguate'
-                    x, y = self._pos_to_widget(touch.ox, touch.oy)
-                    self._velocity_start(touch)
-                    self.cg_move_start(touch, x, y)
-
-                if self._gesture_state == 'Disambiguate':
-                    if touch.time_update - touch.time_start < self._SWIPE_TIME:
-                        if self._possible_swipe(touch):
-                            # 'Swipe' but may not see a touch_up.
-                            self._new_gesture()
-                    else:
-                        self._gesture_state = 'Move' 
-
-                if self._gesture_state == 'Scale':
-                    if len(self._touches) <= 2:
-                        indx = self._touches.index(touch)
-                        self._persistent_pos[indx] = tuple(touch.pos)
-                    if len(self._touches) > 1:
-                        finger_distance = self._scale_distance()
-                        if self._finger_distance:
-                            scale = finger_distance / self._finger_distance
-                            if abs(scale) != 1:
-                                x, y = self._scale_midpoint()
-                                self.cg_scale(self._touches[0],
-                                              self._touches[1],
-                                              scale, x, y)
-                        self._finger_distance = finger_distance
-
-                else: 
-                    x, y = self._pos_to_widget(touch.x, touch.y)
-                    if self._gesture_state == 'Move':
-                        self.cg_move_to(touch, x, y, self._velocity_now(touch))
-                        
-                    elif self._gesture_state == 'Long Press Move':
-                        self.cg_long_press_move_to(touch, x, y,
-                                                   self._velocity_now(touch))
-                        
+                self._MOVE_HANDLERS[self._gesture_state](self, touch)
         return super().on_touch_move(touch)                    
 
     ### touch up ###
     def on_touch_up(self, touch):
-        if touch in self._touches:
-
+        if touch.uid in self._pointers:
             self._not_long_press()
+            if self.coalesced_samples:
+                # deliver the last moves before the end of the gesture
+                self._flush_moves()
             x, y = self._pos_to_widget(touch.x, touch.y)
+            self._UP_HANDLERS[self._gesture_state](self, touch, x, y)
+        return super().on_touch_up(touch)                
 
-            if self._gesture_state == 'Dont Know':
-                if touch.is_double_tap:
-                    self._not_single_tap()
-                    self.cg_double_tap(touch, x, y)
-                    self._new_gesture()
-                else:
-                    self._remove_gesture(touch)
+    ############################################
+    # State handlers
+    ############################################
+    # One handler per state for each of move and up, selected by a single
+    # table lookup. A handler that changes state may pass the event on to
+    # the handler for the new state.
 
-            elif self._gesture_state == 'Right':
-                self.cg_two_finger_tap(touch, x, y)
-                
-            elif self._gesture_state == 'Scale':
-                self.cg_scale_end(self._touches[0], self._touches[1])
-                self._new_gesture()
+    ### touch move ###
+    def _move_ignore(self, touch):
+        pass
 
-            elif self._gesture_state == 'Long Press Move':
-                self.cg_long_press_move_end(touch, x, y)
+    def _move_dont_know(self, touch):
+        self._gesture_state = DISAMBIGUATE
+        x, y = self._pos_to_widget(touch.ox, touch.oy)
+        self._velocity_start(touch)
+        self.cg_move_start(touch, x, y)
+        self._move_disambiguate(touch)
+
+    def _move_disambiguate(self, touch):
+        self._velocity_add(touch)
+        if touch.time_update - touch.time_start < self._SWIPE_TIME:
+            if self._possible_swipe(touch):
+                # 'Swipe' but may not see a touch_up.
                 self._new_gesture()
+        else:
+            self._gesture_state = MOVE
+            self._move_move(touch)
+
+    def _move_move(self, touch):
+        self._velocity_add(touch)
+        x, y = self._pos_to_widget(touch.x, touch.y)
+        if self.coalesce_moves:
+            self._coalesce(touch, x, y)
+        else:
+            self.cg_move_to(touch, x, y, self._move_speed())
+
+    def _move_long_pressed(self, touch):
+        self._gesture_state = LONG_PRESS_MOVE
+        x, y = self._pos_to_widget(touch.ox, touch.oy)
+        self._velocity_start(touch)
+        self.cg_long_press_move_start(touch, x, y)
+        self._move_long_press_move(touch)
+
+    def _move_long_press_move(self, touch):
+        self._velocity_add(touch)
+        x, y = self._pos_to_widget(touch.x, touch.y)
+        if self.coalesce_moves:
+            self._coalesce(touch, x, y)
+        else:
+            self.cg_long_press_move_to(touch, x, y, self._move_speed())
 
-            elif self._gesture_state == 'Move':
-                self.cg_move_end(touch, x, y)
-                self._new_gesture()
+    def _move_scale(self, touch):
+        # The pointer position was saved by on_touch_move()
+        if not self.coalesce_moves:
+            self._scale_update()
+        else:
+            x, y = self._pos_to_widget(touch.x, touch.y)
+            self._coalesce(touch, x, y)
+
+    def _scale_update(self):
+        # Scale, rotate, and pan of all the pointers about their centroid,
+        # since the last update, in one pass.
+        # The scale is the ratio of the rms distances from the centroid.
+        # The angle is the least squares rotation about the centroid, from
+        # the sums of the cross and dot products of the pointer positions,
+        # less those of the centroids. For two fingers these are the ratio
+        # of the finger distances and the rotation of the line between them.
+        pointers = self._pointers
+        n = len(pointers)
+        if n < 2:
+            return
+        sx = sy = rx = ry = ss = rr = cross = dot = 0.0
+        for p in pointers.values():
+            x, y, x0, y0 = p.x, p.y, p.ref_x, p.ref_y
+            sx += x
+            sy += y
+            rx += x0
+            ry += y0
+            ss += x * x + y * y
+            rr += x0 * x0 + y0 * y0
+            cross += x0 * y - y0 * x
+            dot += x0 * x + y0 * y
+            p.ref_x, p.ref_y = x, y
+        cx, cy = sx / n, sy / n
+        cx0, cy0 = rx / n, ry / n
+        spread = ss / n - cx * cx - cy * cy
+        spread0 = rr / n - cx0 * cx0 - cy0 * cy0
+        cross -= n * (cx0 * cy - cy0 * cx)
+        dot -= n * (cx0 * cx + cy0 * cy)
+        touch0, touch1 = self._scale_touches()
+        x, y = self._pos_to_widget(cx, cy)
+        if spread > 0 and spread0 > 0:
+            scale = sqrt(spread / spread0)
+            if scale != 1:
+                self.cg_scale(touch0, touch1, scale, x, y)
+        if cross:
+            self.cg_rotate(touch0, touch1, degrees(atan2(cross, dot)), x, y)
+        if cx != cx0 or cy != cy0:
+            self.cg_pan(touch0, touch1, cx - cx0, cy - cy0, x, y)
+
+    _MOVE_HANDLERS = _state_table({DONT_KNOW: _move_dont_know,
+                                   DISAMBIGUATE: _move_disambiguate,
+                                   MOVE: _move_move,
+                                   LONG_PRESSED: _move_long_pressed,
+                                   LONG_PRESS_MOVE: _move_long_press_move,
+                                   SCALE: _move_scale},
+                                  _move_ignore)
+
+    ### coalesced moves ###
+    def _coalesce(self, touch, x, y):
+        self.coalesced_samples.append((touch, x, y, touch.time_update))
+        self._flush_trigger()
+
+    def _flush_moves(self, *args):
+        # One callback for all the samples since the last frame.
+        # Velocity is estimated from every sample, scale is the product of
+        # the per sample scales.
+        self._flush_trigger.cancel()
+        samples = self.coalesced_samples
+        if not samples:
+            return
+        touch, x, y, t = samples[-1]
+        state = self._gesture_state
+        if state == SCALE:
+            self._scale_update()
+        elif state == MOVE:
+            self.cg_move_to(touch, x, y, self._move_speed())
+        elif state == LONG_PRESS_MOVE:
+            self.cg_long_press_move_to(touch, x, y, self._move_speed())
+        samples.clear()
 
-            elif self._gesture_state == 'Long Pressed':
-                self.cg_long_press_end(touch, x, y)
-                self._new_gesture()
+    ### touch up ###
+    def _up_ignore(self, touch, x, y):
+        pass
 
-            elif self._gesture_state == 'PotentialPage':
-                self._potential_page(touch)
-                self._new_gesture()
-                
-            elif self._gesture_state == 'Wheel' or\
-                 self._gesture_state == 'Disambiguate' or\
-                 self._gesture_state == 'Swipe':
-                self._new_gesture()
+    def _up_end(self, touch, x, y):
+        self._new_gesture()
 
-        return super().on_touch_up(touch)                
+    def _up_dont_know(self, touch, x, y):
+        if touch.is_double_tap:
+            self._not_single_tap()
+            self.cg_double_tap(touch, x, y)
+            self._new_gesture()
+        else:
+            self._remove_gesture(touch)
+
+    def _up_right(self, touch, x, y):
+        self.cg_two_finger_tap(touch, x, y)
+        self._new_gesture()
+
+    def _up_scale(self, touch, x, y):
+        if len(self._pointers) > 2:
+            # The other fingers continue the gesture
+            del self._pointers[touch.uid]
+            self._rebase_pointers()
+        else:
+            self.cg_scale_end(*self._scale_touches())
+            self._new_gesture()
+
+    def _up_long_press_move(self, touch, x, y):
+        self.cg_long_press_move_end(touch, x, y)
+        self._new_gesture()
+
+    def _up_move(self, touch, x, y):
+        self.cg_move_end(touch, x, y)
+        self._new_gesture()
+
+    def _up_long_pressed(self, touch, x, y):
+        self.cg_long_press_end(touch, x, y)
+        self._new_gesture()
+
+    def _up_potential_page(self, touch, x, y):
+        self._potential_page(touch)
+        self._new_gesture()
+
+    _UP_HANDLERS = _state_table({DONT_KNOW: _up_dont_know,
+                                 RIGHT: _up_right,
+                                 SCALE: _up_scale,
+                                 LONG_PRESS_MOVE: _up_long_press_move,
+                                 MOVE: _up_move,
+                                 LONG_PRESSED: _up_long_pressed,
+                                 POTENTIAL_PAGE: _up_potential_page,
+                                 WHEEL: _up_end,
+                                 DISAMBIGUATE: _up_end,
+                                 SWIPE: _up_end},
+                                _up_ignore)
 
     ############################################
     # gesture utilities
     ############################################
     #
 
+    ### hand over to an enclosing CommonGestures ###
+    def _hand_over(self, owner):
+        # End the gesture in progress here, owner continues it with the
+        # same touches, see Gesture arbitration.
+        self._not_long_press()
+        self._not_single_tap()
+        if self.coalesced_samples:
+            self._flush_moves()
+        pointers = list(self._pointers.values())
+        if not pointers:
+            return
+        touch = pointers[-1].touch
+        x, y = self._pos_to_widget(pointers[-1].x, pointers[-1].y)
+        state = self._gesture_state
+        if state == MOVE:
+            self.cg_move_end(touch, x, y)
+        elif state == LONG_PRESSED:
+            self.cg_long_press_end(touch, x, y)
+        elif state == LONG_PRESS_MOVE:
+            self.cg_long_press_move_end(touch, x, y)
+        elif state == SCALE:
+            self.cg_scale_end(*self._scale_touches())
+        for p in pointers:
+            # Saved positions are in the parent's coordinates
+            p.x, p.y = owner.to_parent(*owner.to_widget(*self.to_window(p.x,
+                                                                        p.y)))
+            p.touch.ud['cg_owner'] = owner
+            owner._pointers[p.touch.uid] = p
+        _ACTIVE.add(owner)
+        self._new_gesture()
+
     ### long press clock ###
-    def _long_press_event(self, touch, x, y, ox, oy, dt):
-        self._long_press_schedule = None
-        distance_squared = (x - ox) ** 2 + (y - oy) ** 2
+    def _long_press_event(self, dt):
+        x, y = self._press_x, self._press_y
+        distance_squared = (x - self._press_ox) ** 2 + (y - self._press_oy) ** 2
         if distance_squared < self._DOUBLE_TAP_DISTANCE ** 2:
             x, y = self._pos_to_widget(x, y)
-            self.cg_long_press(touch, x, y)
-            self._gesture_state = 'Long Pressed'
+            self.cg_long_press(self._press_touch, x, y)
+            self._gesture_state = LONG_PRESSED
 
     def _not_long_press(self):
-        if self._long_press_schedule:
-            Clock.unschedule(self._long_press_schedule)
-            self._long_press_schedule = None
+        self._long_press_trigger.cancel()
 
     ### single tap clock ###
-    def _single_tap_event(self, touch, x, y, dt):
-        if self._gesture_state == 'Dont Know':
-            if not self._long_press_schedule:
-                x, y = self._pos_to_widget(x, y)
-                self.cg_tap(touch,x,y)
+    def _single_tap_event(self, dt):
+        if self._gesture_state == DONT_KNOW:
+            if not self._long_press_trigger.is_triggered:
+                x, y = self._pos_to_widget(self._tap_x, self._tap_y)
+                self.cg_tap(self._tap_touch, x, y)
                 self._new_gesture()
 
     def _not_single_tap(self):
-        if self._single_tap_schedule:
-            Clock.unschedule(self._single_tap_schedule)
-            self._single_tap_schedule = None
+        self._single_tap_trigger.cancel()
 
     def _possible_swipe(self, touch):
         x, y = touch.pos 
         ox, oy = touch.opos
-        period = touch.time_update - touch.time_start
-        distance = sqrt((x - ox) ** 2 + (y - oy) ** 2)
-        if period:
-            velocity = distance / (period * Metrics.dpi)
-        else:
-            velocity = 0
-
-        if velocity > self._SWIPE_VELOCITY:
+        if self._move_speed() > self._SWIPE_VELOCITY:
             # A Swipe pre-empts a Move, so reset the Move
             wox, woy = self._pos_to_widget(ox, oy)
             self.cg_move_to(touch, wox, woy, self._velocity)
@@ -305,20 +596,35 @@ class CommonGestures(Widget):
             return True
         return False
 
+    ### move velocity ###
+    # Every move sample is added to the estimator as it arrives, including
+    # coalesced samples, callbacks read the estimate.
     def _velocity_start(self, touch):
-        self._velx , self._vely = touch.opos
-        self._velt = touch.time_start
-        
-    def _velocity_now(self, touch):
-        period = touch.time_update - self._velt
-        x, y = touch.pos
-        distance = sqrt((x - self._velx) ** 2 + (y - self._vely) ** 2)
-        self._velt = touch.time_update
-        self._velx , self._vely = touch.pos
-        if period:
-            return distance / (period * Metrics.dpi) 
-        else:
-            return 0
+        self._velocity_estimator.reset()
+        self._velocity_estimator.add(touch.time_start, touch.ox, touch.oy)
+
+    def _velocity_add(self, touch):
+        self._velocity_estimator.add(touch.time_update, touch.x, touch.y)
+
+    def _move_speed(self):
+        # inches/sec
+        return self._velocity_estimator.speed() / Metrics.dpi
+
+    def on_velocity_filter(self, instance, value):
+        self._velocity_estimator.method = value
+        self._velocity_estimator.reset()
+
+    # The (x, y) velocity in inches/sec, and acceleration in inches/sec/sec,
+    # of the move of touch. Estimated by the touch's owner, so they are
+    # also valid in a forwarded cg_move_to().
+    def move_velocity(self, touch):
+        vx, vy = touch.ud.get('cg_owner', self)._velocity_estimator.velocity()
+        return vx / Metrics.dpi, vy / Metrics.dpi
+
+    def move_acceleration(self, touch):
+        ax, ay = touch.ud.get('cg_owner',
+                              self)._velocity_estimator.acceleration()
+        return ax / Metrics.dpi, ay / Metrics.dpi
 
     ### potential page ####
     def _potential_page(self,touch):
@@ -366,22 +672,28 @@ class CommonGestures(Widget):
     def touch_vertical(self, touch):   
         return abs(touch.y-touch.oy) > abs(touch.x-touch.ox)
 
-    ### Two finger touch ###
-    
-    def _scale_distance(self):
-        x0, y0 = self._persistent_pos[0]
-        x1, y1 = self._persistent_pos[1]
-        return sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)    
-
-    def _scale_midpoint(self):
-        x0, y0 = self._persistent_pos[0]
-        x1, y1 = self._persistent_pos[1]
-        midx = abs(x0 - x1) / 2 + min(x0, x1)
-        midy = abs(y0 - y1) / 2 + min(y0, y1)
-        # convert to widget
-        x = midx - self.x
-        y = midy - self.y
-        return x, y
+    ### Multi-touch ###
+
+    def gesture_touches(self):
+        # The touches of the current gesture, in touch down order
+        return [p.touch for p in self._pointers.values()]
+
+    def _scale_touches(self):
+        # The first two touches, the touch0 and touch1 of the cg_* events
+        pointers = iter(self._pointers.values())
+        return next(pointers).touch, next(pointers).touch
+
+    def _rebase_pointers(self):
+        # The next update is relative to the current positions
+        for p in self._pointers.values():
+            p.ref_x, p.ref_y = p.x, p.y
+
+    def _centroid(self):
+        # In widget coordinates
+        pointers = self._pointers.values()
+        n = len(pointers)
+        return (sum(p.x for p in pointers) / n - self.x,
+                sum(p.y for p in pointers) / n - self.y)
 
     ### Every result is in the self frame ###
 
@@ -391,107 +703,226 @@ class CommonGestures(Widget):
     ### gesture utilities ###
 
     def _remove_gesture(self, touch):
-        if touch and len(self._touches):
-            if touch in self._touches:
-                self._touches.remove(touch)
+        if touch:
+            self._pointers.pop(touch.uid, None)
+            if not self._pointers:
+                _ACTIVE.discard(self)
             
     def _new_gesture(self):
-        self._touches = []
-        self._long_press_schedule = None
-        self._single_tap_schedule = None
-        self._velocity_schedule = None
-        self._gesture_state = 'None'
-        self._finger_distance = 0
+        self._pointers.clear()
+        _ACTIVE.discard(self)
+        self._gesture_state = NONE
         self._velocity = 0
+        self.coalesced_samples.clear()
+        self._flush_trigger.cancel()
+        self._recipients.clear()
 
-    ### CTRL SHIFT key detect
-    def _ctrl_key_down(self, a, b, c, d, modifiers):
-        command_key = platform == 'macosx' and 'meta' in modifiers
-        if 'ctrl' in modifiers or command_key:
-            self._CTRL = True
-
-    def _shift_key_down(self, a, b, c, d, modifiers):
-        if 'shift' in modifiers:
-            self._SHIFT = True
-        
-    def _key_up(self, *args):
-        self._CTRL = False
-        self._SHIFT = False
+    ############################################
+    # Tracing
+    ############################################
+    # trace(tracer) instruments this instance. Touch events, long press and
+    # tap Clock events, state transitions, and cg_* callbacks are recorded
+    # with their duration by the tracer, for example a
+    # gesturetrace.GestureTracer. trace(None) removes the instrumentation.
+    #
+    # The instrumentation is instance attributes that wrap the methods,
+    # an instance that is not traced runs no tracing code.
+
+    _TRACED_EVENTS = ('on_touch_down', 'on_touch_move', 'on_touch_up',
+                      '_flush_moves')
+    _TRACED_TIMERS = (('_long_press_event', '_LONG_PRESS'),
+                      ('_single_tap_event', '_DOUBLE_TAP_TIME'))
+
+    def trace(self, tracer):
+        for name in list(vars(self)):
+            if name in self._TRACED_EVENTS or name.startswith('cg_') or\
+               name in dict(self._TRACED_TIMERS):
+                delattr(self, name)
+        if tracer is not None:
+            lane = '{} {:x}'.format(type(self).__name__, id(self))
+            for name in self._TRACED_EVENTS:
+                setattr(self, name, self._traced_event(tracer, lane, name))
+            for name, delay in self._TRACED_TIMERS:
+                setattr(self, name,
+                        self._traced_timer(tracer, lane, name, delay))
+            for name in dir(type(self)):
+                if name.startswith('cg_'):
+                    setattr(self, name,
+                            self._traced_callback(tracer, lane, name))
+        # The triggers call the current methods
+        self._flush_trigger.cancel()
+        self._flush_trigger = Clock.create_trigger(self._flush_moves)
+        self._long_press_trigger.cancel()
+        self._long_press_trigger = Clock.create_trigger(self._long_press_event,
+                                                        self._LONG_PRESS)
+        self._single_tap_trigger.cancel()
+        self._single_tap_trigger = Clock.create_trigger(self._single_tap_event,
+                                                        self._DOUBLE_TAP_TIME)
+
+    def _traced_event(self, tracer, lane, name):
+        method = getattr(self, name)
+
+        def traced(*args):
+            before = self._gesture_state
+            start = perf_counter()
+            result = method(*args)
+            end = perf_counter()
+            tracer.complete(name, 'event', lane, start, end - start,
+                            {'state': STATE_NAMES[before]})
+            if self._gesture_state != before:
+                tracer.instant('transition', 'state', lane, end,
+                               {'from': STATE_NAMES[before],
+                                'to': STATE_NAMES[self._gesture_state]})
+            return result
+        return traced
+
+    def _traced_timer(self, tracer, lane, name, delay_name):
+        # A Clock event, dt is the last argument
+        traced_event = self._traced_event(tracer, lane, name)
+
+        def traced(*args):
+            late = args[-1] - getattr(self, delay_name)
+            tracer.instant('clock_delay', 'clock', lane, perf_counter(),
+                           {'event': name, 'late_ms': late * 1000})
+            return traced_event(*args)
+        return traced
+
+    def _traced_callback(self, tracer, lane, name):
+        method = getattr(self, name)
+
+        def traced(*args):
+            touch = args[0]
+            start = perf_counter()
+            result = method(*args)
+            end = perf_counter()
+            tracer.complete(name, 'callback', lane, start, end - start,
+                            {'since_touch_ms':
+                             (time() - touch.time_update) * 1000})
+            return result
+        return traced
+
+    ### forward a gesture that is not handled ###
+    # The index of the x argument of each cg_* method, y follows it
+    _POSITION_ARG = {'cg_tap': 1, 'cg_two_finger_tap': 1, 'cg_double_tap': 1,
+                     'cg_long_press': 1, 'cg_long_press_end': 1,
+                     'cg_move_start': 1, 'cg_move_to': 1, 'cg_move_end': 1,
+                     'cg_long_press_move_start': 1,
+                     'cg_long_press_move_to': 1, 'cg_long_press_move_end': 1,
+                     'cg_scale_start': 2, 'cg_scale': 3, 'cg_rotate': 3,
+                     'cg_pan': 4, 'cg_wheel': 2,
+                     'cg_ctrl_wheel': 2, 'cg_shift_wheel': 2}
+
+    def _forward(self, name, *args):
+        # The recipient is found once per gesture
+        recipient = self._recipients.get(name, self)
+        if recipient is self:
+            recipient = self.parent
+            while recipient is not None and not\
+                  (isinstance(recipient, CommonGestures) and
+                   _handles(recipient, name)):
+                recipient = recipient.parent
+            self._recipients[name] = recipient
+        if recipient is None:
+            return
+        index = self._POSITION_ARG.get(name)
+        if index is not None:
+            # widget coordinates of the recipient
+            x0, y0 = self.to_window(self.x, self.y)
+            x1, y1 = recipient.to_window(recipient.x, recipient.y)
+            args = list(args)
+            args[index] += x0 - x1
+            args[index + 1] += y0 - y1
+        getattr(recipient, name)(*args)
 
     ############################################
     # User Events
     # define some subset in the derived class
+    # Gestures that are not defined are passed to an enclosing
+    # CommonGestures, if there is one.
     ############################################
 
     ############# Tap, Double Tap, and Long Press
     def cg_tap(self, touch, x, y):
-        pass
+        self._forward('cg_tap', touch, x, y)
 
     def cg_two_finger_tap(self, touch, x, y):
         # also a mouse right click, desktop only
-        pass
+        self._forward('cg_two_finger_tap', touch, x, y)
 
     def cg_double_tap(self, touch, x, y):
-        pass
+        self._forward('cg_double_tap', touch, x, y)
 
     def cg_long_press(self, touch, x, y):
-        pass
+        self._forward('cg_long_press', touch, x, y)
 
     def cg_long_press_end(self, touch, x, y):
-        pass
+        self._forward('cg_long_press_end', touch, x, y)
 
     ############## Move
     def cg_move_start(self, touch, x, y):
-        pass
+        self._forward('cg_move_start', touch, x, y)
 
     def cg_move_to(self, touch, x, y, velocity):
-        # velocity is average of the last self._MOVE_VELOCITY_SAMPLE sec,
+        # velocity is the speed over the last self._MOVE_VELOCITY_SAMPLE sec,
         # in inches/sec  :)
-        pass
+        # move_velocity(touch) and move_acceleration(touch) are the vectors.
+        self._forward('cg_move_to', touch, x, y, velocity)
 
     def cg_move_end(self, touch, x, y):
-        pass
+        self._forward('cg_move_end', touch, x, y)
 
     ############### Move preceded by a long press.
     # cg_long_press() called first, cg_long_press_end() is not called
     def cg_long_press_move_start(self, touch, x, y):
-        pass
+        self._forward('cg_long_press_move_start', touch, x, y)
 
     def cg_long_press_move_to(self, touch, x, y, velocity):
-        # velocity is average of the last self._MOVE_VELOCITY_SAMPLE,
+        # velocity is the speed over the last self._MOVE_VELOCITY_SAMPLE,
         # in inches/sec  :)
-        pass
+        # move_velocity(touch) and move_acceleration(touch) are the vectors.
+        self._forward('cg_long_press_move_to', touch, x, y, velocity)
 
     def cg_long_press_move_end(self, touch, x, y):
-        pass
+        self._forward('cg_long_press_move_end', touch, x, y)
 
     ############### a fast move
     def cg_swipe_horizontal(self, touch, left_to_right):
-        pass
+        self._forward('cg_swipe_horizontal', touch, left_to_right)
 
     def cg_swipe_vertical(self, touch, bottom_to_top):
-        pass
+        self._forward('cg_swipe_vertical', touch, bottom_to_top)
 
-    ############### pinch/spread
+    ############### pinch/spread, rotate, and pan with two or more fingers
+    # touch0 and touch1 are the first two fingers, gesture_touches() are all
+    # of them. x, y is the centroid of the fingers.
+    # A finger may join or leave, the gesture ends when one of two lifts.
     def cg_scale_start(self, touch0, touch1, x, y):
-        pass
+        self._forward('cg_scale_start', touch0, touch1, x, y)
 
     def cg_scale(self, touch0, touch1, scale, x, y):
-        pass
+        self._forward('cg_scale', touch0, touch1, scale, x, y)
+
+    def cg_rotate(self, touch0, touch1, angle, x, y):
+        # angle in degrees, counterclockwise
+        self._forward('cg_rotate', touch0, touch1, angle, x, y)
+
+    def cg_pan(self, touch0, touch1, delta_x, delta_y, x, y):
+        # the centroid moved by delta_x, delta_y
+        self._forward('cg_pan', touch0, touch1, delta_x, delta_y, x, y)
 
     def cg_scale_end(self, touch0, touch1):
-        pass
+        self._forward('cg_scale_end', touch0, touch1)
 
     ############# Mouse Wheel, or Windows touch pad two finger vertical move
     
     ############# a common shortcut for scroll
     def cg_wheel(self, touch, scale, x, y):
-        pass
+        self._forward('cg_wheel', touch, scale, x, y)
 
     ############# a common shortcut for pinch/spread
     def cg_ctrl_wheel(self, touch, scale, x, y):
-        pass
+        self._forward('cg_ctrl_wheel', touch, scale, x, y)
 
     ############# a common shortcut for horizontal scroll
     def cg_shift_wheel(self, touch, scale, x, y):
-        pass
+        self._forward('cg_shift_wheel', touch, scale, x, y)
@@ -2,7 +2,8 @@ from kivy.uix.label import Label
 from kivy.uix.boxlayout import BoxLayout
 from kivy.config import Config
 from kivy.utils import platform
-from textwrap import fill
+from functools import lru_cache
+import textwrap
 
 from swipescreen import SwipeScreen
 from gesturelabel import GestureLabel
@@ -10,6 +11,16 @@ from gestureboxlayout  import GestureBoxLayout
 from gesturecanvas import GestureCanvas
 from zoomimage import ZoomImage
 
+### Wrapped text
+# The screens are wrapped to a few widths, each wrap is done once.
+
+@lru_cache(maxsize=None)
+def _fill(text, cols, platform):
+    return textwrap.fill(text, cols)
+
+def fill(text, cols):
+    return _fill(text, cols, platform)
+
 ### SwipeScreen layouts
 
 class Screen1(SwipeScreen):
@@ -18,9 +29,8 @@ class Screen1(SwipeScreen):
         self.label = Label()
         self.add_widget(self.label)
 
-    def on_size(self, *args):
-        mobile = platform == 'android' or platform == 'ios'
-        if self.width > self.height:
+    def layout_screen(self, mobile, landscape):
+        if landscape:
             COLS = 80
         else:
             COLS = 40
@@ -53,18 +63,17 @@ class Screen2(SwipeScreen):
         self.box1 = box1
         self.box2 = box2
 
-    def on_size(self, *args):
-        mobile = platform == 'android' or platform == 'ios'
+    def layout_screen(self, mobile, landscape):
         if mobile:
             COLS = 40
-            if self.width > self.height:
+            if landscape:
                 self.box1.orientation = 'horizontal'
                 self.box2.orientation = 'vertical'
             else:
                 self.box1.orientation = 'vertical'
                 self.box2.orientation = 'horizontal'
         else:
-            if self.width > self.height:
+            if landscape:
                 COLS = 80
             else:
                 COLS = 40
@@ -95,16 +104,15 @@ class Screen3(SwipeScreen):
         self.box = GestureBoxLayout()
         self.add_widget(self.box)
 
-    def on_size(self, *args):
-        mobile = platform == 'android' or platform == 'ios'
+    def layout_screen(self, mobile, landscape):
         if mobile:
             COLS = 40
-            if self.width > self.height:
+            if landscape:
                 self.box.orientation = 'horizontal'
             else:
                 self.box.orientation = 'vertical'
         else:
-            if self.width > self.height:
+            if landscape:
                 COLS = 80
             else:
                 COLS = 40
@@ -124,21 +132,20 @@ class Screen4(SwipeScreen):
         super().__init__(**args)
         self.label = Label()
         box = BoxLayout(orientation='vertical')
-        box.add_widget(GestureCanvas())
+        box.add_widget(GestureCanvas(coalesce_moves = True))
         box.add_widget(self.label)
         self.add_widget(box)
         self.box = box
 
-    def on_size(self, *args):
-        mobile = platform == 'android' or platform == 'ios'
+    def layout_screen(self, mobile, landscape):
         if mobile:
             COLS = 40
-            if self.width > self.height:
+            if landscape:
                 self.box.orientation = 'horizontal'
             else:
                 self.box.orientation = 'vertical'
         else:
-            if self.width > self.height:
+            if landscape:
                 COLS = 80
             else:
                 COLS = 40
@@ -163,23 +170,22 @@ class Screen5(SwipeScreen):
         super().__init__(**args)
         label = Label()  
         box = BoxLayout(orientation='vertical')
-        box.add_widget(ZoomImage(source = 'test.jpg'))
+        box.add_widget(ZoomImage(source = 'test.jpg', kinetic = True))
         box.add_widget(label)
         self.add_widget(box)
         self.box = box
         self.label = label
 
-    def on_size(self, *args):
-        mobile = platform == 'android' or platform == 'ios'
+    def layout_screen(self, mobile, landscape):
         if mobile:
             COLS = 40
-            if self.width > self.height:
+            if landscape:
                 self.box.orientation = 'horizontal'
             else:
                 self.box.orientation = 'vertical'
         else:
             self.label.size_hint_y = 0.4
-            if self.width > self.height:
+            if landscape:
                 COLS = 80
             else:
                 COLS = 40
@@ -0,0 +1,132 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+### Geometry of many quadrilaterals
+###################################################
+# The vertices of every shape, stored by shape index, in Window coordinates.
+# A point is inside a convex quad if it is on the same side of all four
+# edges, the sign of each edge's cross product is the same.
+#
+# `hits(indices, x, y)` tests many shapes against one point, and returns
+# a list of shape indices. `inside_rect(indices, ...)` tests many shapes
+# against a rectangle, and returns a list of booleans. Each in one call.
+# NumpyGeometry does each call as array operations, PythonGeometry is
+# the fallback if NumPy is not available.
+#
+# Array operations have a fixed overhead of some tens of microseconds,
+# so NumpyGeometry keeps the Python lists as well and uses them for
+# batches smaller than `batch`, such as the few candidates from a
+# SpatialGrid cell.
+
+def make_geometry(backend='auto'):
+    if backend == 'numpy' or (backend == 'auto' and numpy is not None):
+        return NumpyGeometry()
+    return PythonGeometry()
+
+
+class PythonGeometry:
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._x = []    # a list of four x per shape
+        self._y = []
+
+    def __len__(self):
+        return len(self._x)
+
+    def append(self, box_x, box_y):
+        self._x.append(list(box_x))
+        self._y.append(list(box_y))
+        return len(self._x) - 1
+
+    def set_shape(self, index, box_x, box_y):
+        self._x[index][:] = box_x
+        self._y[index][:] = box_y
+
+    def contains(self, index, x, y):
+        x0, x1, x2, x3 = self._x[index]
+        y0, y1, y2, y3 = self._y[index]
+        c0 = (x1 - x0) * (y - y0) - (y1 - y0) * (x - x0)
+        c1 = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+        c2 = (x3 - x2) * (y - y2) - (y3 - y2) * (x - x2)
+        c3 = (x0 - x3) * (y - y3) - (y0 - y3) * (x - x3)
+        return (c0 >= 0 and c1 >= 0 and c2 >= 0 and c3 >= 0) or\
+            (c0 <= 0 and c1 <= 0 and c2 <= 0 and c3 <= 0)
+
+    def hits(self, indices, x, y):
+        # The indices of the shapes that contain x, y
+        contains = self.contains
+        return [i for i in indices if contains(i, x, y)]
+
+    def inside_rect(self, indices, xmin, ymin, xmax, ymax):
+        # For each shape, True if all its vertices are in the rectangle
+        result = []
+        for i in indices:
+            x0, x1, x2, x3 = self._x[i]
+            y0, y1, y2, y3 = self._y[i]
+            result.append(xmin <= x0 <= xmax and xmin <= x1 <= xmax and
+                          xmin <= x2 <= xmax and xmin <= x3 <= xmax and
+                          ymin <= y0 <= ymax and ymin <= y1 <= ymax and
+                          ymin <= y2 <= ymax and ymin <= y3 <= ymax)
+        return result
+
+
+class NumpyGeometry(PythonGeometry):
+
+    # Batches smaller than this use the Python lists
+    BATCH = 64
+
+    def __init__(self, batch=BATCH):
+        if numpy is None:
+            raise ImportError('NumpyGeometry requires numpy')
+        self.batch = batch
+        super().__init__()
+
+    def clear(self):
+        super().clear()
+        # Contiguous (capacity, 4) arrays, the first len(self) rows are used
+        self._ax = numpy.zeros((16, 4))
+        self._ay = numpy.zeros((16, 4))
+
+    def append(self, box_x, box_y):
+        index = super().append(box_x, box_y)
+        if index == len(self._ax):
+            self._ax = numpy.concatenate((self._ax,
+                                          numpy.zeros_like(self._ax)))
+            self._ay = numpy.concatenate((self._ay,
+                                          numpy.zeros_like(self._ay)))
+        self._ax[index] = box_x
+        self._ay[index] = box_y
+        return index
+
+    def set_shape(self, index, box_x, box_y):
+        super().set_shape(index, box_x, box_y)
+        self._ax[index] = box_x
+        self._ay[index] = box_y
+
+    def hits(self, indices, x, y):
+        if len(indices) < self.batch:
+            return super().hits(indices, x, y)
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        inside = self._contains(self._ax[indices], self._ay[indices], x, y)
+        return indices[inside].tolist()
+
+    def inside_rect(self, indices, xmin, ymin, xmax, ymax):
+        if len(indices) < self.batch:
+            return super().inside_rect(indices, xmin, ymin, xmax, ymax)
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        x = self._ax[indices]
+        y = self._ay[indices]
+        return ((x.min(axis=1) >= xmin) & (y.min(axis=1) >= ymin) &
+                (x.max(axis=1) <= xmax) & (y.max(axis=1) <= ymax)).tolist()
+
+    def _contains(self, vx, vy, x, y):
+        # vx, vy are (n, 4), the result is n booleans
+        ex = numpy.roll(vx, -1, axis=1) - vx
+        ey = numpy.roll(vy, -1, axis=1) - vy
+        cross = ex * (y - vy) - ey * (x - vx)
+        return (cross >= 0).all(axis=1) | (cross <= 0).all(axis=1)
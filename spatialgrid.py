@@ -0,0 +1,62 @@
+from math import floor
+
+### A uniform grid spatial index
+###################################################
+# Items are stored in every grid cell their bounding box overlaps.
+# A point query returns the items in one cell, the candidates for an
+# exact hit test. The cost of a query depends on the number of items
+# in a cell, not on the total number of items.
+
+class SpatialGrid:
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.clear()
+
+    def clear(self):
+        self._cells = {}      # (i, j) -> list of items
+        self._extent = {}     # item -> (i0, j0, i1, j1)
+
+    def __len__(self):
+        return len(self._extent)
+
+    def insert(self, item, xmin, ymin, xmax, ymax):
+        extent = self._cell_extent(xmin, ymin, xmax, ymax)
+        self._extent[item] = extent
+        i0, j0, i1, j1 = extent
+        cells = self._cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = cells.get((i, j))
+                if cell is None:
+                    cells[(i, j)] = [item]
+                else:
+                    cell.append(item)
+
+    def remove(self, item):
+        i0, j0, i1, j1 = self._extent.pop(item)
+        cells = self._cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = cells[(i, j)]
+                cell.remove(item)
+                if not cell:
+                    del cells[(i, j)]
+
+    def update(self, item, xmin, ymin, xmax, ymax):
+        # Only touch the cells if the item moved to different cells
+        if self._extent.get(item) != self._cell_extent(xmin, ymin,
+                                                       xmax, ymax):
+            if item in self._extent:
+                self.remove(item)
+            self.insert(item, xmin, ymin, xmax, ymax)
+
+    def query_point(self, x, y):
+        # Candidates that may contain (x, y), in insertion order per cell
+        size = self.cell_size
+        return self._cells.get((floor(x / size), floor(y / size)), ())
+
+    def _cell_extent(self, xmin, ymin, xmax, ymax):
+        size = self.cell_size
+        return (floor(xmin / size), floor(ymin / size),
+                floor(xmax / size), floor(ymax / size))
@@ -1,9 +1,55 @@
 from kivy.app import App
 from kivy.uix.screenmanager import Screen
+from kivy.clock import Clock
+from kivy.utils import platform
 from gestures4kivy import CommonGestures
 
+RESIZE_DEBOUNCE = 0.1   # sec, a resize burst ends after this quiet time
+
 ### A swipe sensitive Screen, parent of all screen layouts
+# Subclasses lay out in layout_screen(mobile, landscape). It is called
+# for the first size, then at the end of each resize burst, and only if
+# the orientation changed.
 class SwipeScreen(Screen, CommonGestures):
+
+    def __init__(self, **args):
+        self._layout_key = None
+        self._layout_trigger = Clock.create_trigger(self._layout,
+                                                    RESIZE_DEBOUNCE)
+        super().__init__(**args)
+
+    def on_size(self, *args):
+        if self._layout_key is None:
+            self._layout()
+        else:
+            # restart the quiet time
+            self._layout_trigger.cancel()
+            self._layout_trigger()
+
+    def _layout(self, *args):
+        mobile = platform == 'android' or platform == 'ios'
+        key = (mobile, self.width > self.height)
+        if key != self._layout_key:
+            self._layout_key = key
+            self.layout_screen(*key)
+
+    def layout_screen(self, mobile, landscape):
+        pass
+
     def cgb_horizontal_page(self, touch, right):
         # one finger horizontal swipe
         App.get_running_app().swipe_screen(right)
+
+    # The state of the widgets on this screen that implement
+    # get_state() and set_state(state), in walk() order.
+    # Used to evict a screen and rehydrate it later.
+    def get_state(self):
+        return [w.get_state() for w in self._stateful()]
+
+    def set_state(self, state):
+        for widget, widget_state in zip(self._stateful(), state):
+            widget.set_state(widget_state)
+
+    def _stateful(self):
+        return [w for w in self.walk(restrict=True)
+                if w is not self and hasattr(w, 'get_state')]
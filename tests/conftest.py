@@ -0,0 +1,13 @@
+import os
+import sys
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_LOG_MODE', 'PYTHON')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# The Window before any widget, as in main.py
+from kivy.core.window import Window
@@ -0,0 +1,128 @@
+from kivy.clock import Clock
+from kivy.uix.relativelayout import RelativeLayout
+import pytest
+import gesturebench
+import save
+from save import CommonGestures
+
+
+class Recorder(CommonGestures):
+    # Records the cg_* events that arbitration is concerned with
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.events = []
+
+    def cg_tap(self, touch, x, y):
+        self.events.append(('tap', x, y))
+
+    def cg_two_finger_tap(self, touch, x, y):
+        self.events.append(('two_finger_tap', x, y))
+
+    def cg_move_start(self, touch, x, y):
+        self.events.append(('move_start', x, y))
+
+    def cg_move_end(self, touch, x, y):
+        self.events.append(('move_end', x, y))
+
+    def cg_swipe_horizontal(self, touch, left_to_right):
+        self.events.append(('swipe', left_to_right))
+
+    def cg_scale_start(self, touch0, touch1, x, y):
+        self.events.append(('scale_start', x, y))
+
+    def cg_scale(self, touch0, touch1, scale, x, y):
+        self.events.append(('scale', x, y))
+
+    def cg_pan(self, touch0, touch1, delta_x, delta_y, x, y):
+        self.events.append(('pan', delta_x, delta_y))
+
+    def cg_scale_end(self, touch0, touch1):
+        self.events.append(('scale_end',))
+
+
+class RelativeRecorder(Recorder, RelativeLayout):
+    pass
+
+
+class Driver(gesturebench.TouchDriver):
+    # Dispatches as the Window does, so a RelativeLayout transforms touches
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.latencies = None
+
+    def _dispatch(self, handler, touch):
+        self.widget.dispatch(handler.__name__, touch)
+
+
+def place(widget, parent, pos, size):
+    widget.size_hint = (None, None)
+    widget.pos = pos
+    widget.size = size
+    if parent is not None:
+        parent.add_widget(widget)
+    return widget
+
+@pytest.fixture(autouse=True)
+def no_active():
+    # A failed test does not leave a gesture in progress for the next
+    save._ACTIVE.clear()
+    last_tick = Clock._last_tick
+    yield
+    # The Driver runs the Clock ahead of real time
+    Clock._last_tick = last_tick
+
+@pytest.fixture
+def nested():
+    outer = place(Recorder(), None, (0, 0), (800, 600))
+    middle = place(CommonGestures(), outer, (50, 50), (600, 400))
+    inner = place(Recorder(), middle, (300, 200), (200, 200))
+    return outer, inner
+
+def right_click(d, x, y):
+    t = d.down(x, y, button='right')
+    d.up(t, 0.05)
+    d.advance(1)
+
+GESTURES = dict(gesturebench.GESTURES, right_click=right_click)
+
+@pytest.mark.parametrize('name', sorted(GESTURES))
+@pytest.mark.parametrize('where', [(400, 300), (100, 500)])
+def test_no_gesture_left_active(nested, name, where):
+    outer, inner = nested
+    GESTURES[name](Driver(outer), *where)
+    assert not list(save._ACTIVE)
+    assert not outer._pointers and not inner._pointers
+
+def test_right_click_then_tap_elsewhere(nested):
+    outer, inner = nested
+    d = Driver(outer)
+    right_click(d, 400, 300)
+    gesturebench.tap(d, 100, 500)
+    assert inner.events == [('two_finger_tap', 100, 100)]
+    assert outer.events == [('tap', 100, 500)]
+
+def test_hand_over_to_relative_layout():
+    # A pinch that starts on inner, the second finger outside it.
+    # outer continues the pinch about the centroid, in its own coordinates.
+    outer = place(RelativeRecorder(), None, (100, 100), (700, 500))
+    inner = place(Recorder(), outer, (200, 100), (200, 200))
+    d = Driver(outer)
+    t0 = d.down(350, 300)
+    t1 = d.down(600, 300, 0.01)
+    for i in range(1, 11):
+        d.move(t0, 350 - 3 * i, 300)
+        d.move(t1, 600 + 3 * i, 300, 0)
+    d.up(t0)
+    d.up(t1, 0.01)
+    d.advance(1)
+    assert ('scale_start', 375, 200) in outer.events
+    scales = [e for e in outer.events if e[0] == 'scale']
+    assert scales
+    for name, x, y in scales:
+        assert abs(x - 375) <= 1.5 and y == 200
+    for event in outer.events:
+        if event[0] == 'pan':
+            assert abs(event[1]) <= 3 and event[2] == 0
+    assert not list(save._ACTIVE)
@@ -0,0 +1,50 @@
+from kivy.clock import Clock
+import pytest
+import gesturebench
+from gesturebench import TouchDriver
+
+@pytest.fixture(autouse=True)
+def restore_clock():
+    last_tick = Clock._last_tick
+    yield
+    # The TouchDriver runs the Clock ahead of real time
+    Clock._last_tick = last_tick
+
+def run(coalesce, gesture, shapes=1):
+    widget = gesturebench.make_target('GestureCanvas', coalesce, shapes)
+    draws = []
+    draw_box = widget.draw_box
+    widget.draw_box = lambda x, y: (draws.append((x, y)), draw_box(x, y))
+    d = TouchDriver(widget)
+    d.latencies = None
+    gesturebench.GESTURES[gesture](d, 400, 300)
+    return widget, draws
+
+@pytest.mark.parametrize('gesture', ['drag', 'long_press_drag'])
+def test_coalesced_drag(gesture):
+    each, each_draws = run(False, gesture)
+    frame, frame_draws = run(True, gesture)
+    assert frame.shapes[0].matrix.get() == pytest.approx(
+        each.shapes[0].matrix.get())
+    assert each.shapes[0].matrix.get() != pytest.approx(
+        gesturebench.make_target('GestureCanvas').shapes[0].matrix.get())
+    # Moves at the digitizer rate, draws at the frame rate
+    assert len(frame_draws) * 3 < len(each_draws)
+    assert frame_draws[-1] == each_draws[-1]
+    assert frame.pending is None
+
+def test_coalesced_rejected_together():
+    # A frame's moves that would leave the widget are all rejected
+    widget = gesturebench.make_target('GestureCanvas', True)
+    before = widget.shapes[0].matrix.get()
+    widget.move_box(400, 300, 100, 0)
+    widget.move_box(500, 300, 10000, 0)
+    widget.apply_pending()
+    assert widget.shapes[0].matrix.get() == before
+    assert widget.pending is None
+
+def test_state_includes_pending():
+    widget = gesturebench.make_target('GestureCanvas', True)
+    widget.move_box(400, 300, 10, 0)
+    matrix = widget.get_state()['matrices'][0]
+    assert matrix[12] == pytest.approx(410)
@@ -0,0 +1,92 @@
+from kivy.clock import Clock
+import pytest
+import gesturebench
+from gesturebench import TouchDriver, FRAME, SAMPLE
+from zoomimage import ZoomImage
+
+@pytest.fixture(autouse=True)
+def restore_clock():
+    last_tick = Clock._last_tick
+    yield
+    # The TouchDriver runs the Clock ahead of real time
+    Clock._last_tick = last_tick
+
+def zoomed(mobile):
+    widget = ZoomImage('test.jpg', kinetic=True, load_in_background=False)
+    widget.size_hint = (None, None)
+    widget.pos = (0, 0)
+    widget.size = (gesturebench.WIDTH, gesturebench.HEIGHT)
+    widget.mobile = mobile
+    d = TouchDriver(widget)
+    d.latencies = None
+    d.advance(0.5)
+    widget._zi_set_origin(400, 300)
+    widget._zi_transform(400, 300, 4)
+    return widget, d
+
+def pan(d, step, samples):
+    t = d.down(400, 300)
+    for i in range(1, samples + 1):
+        d.move(t, 400 - step * i, 300)
+    d.up(t)
+    return t
+
+@pytest.mark.parametrize('mobile', [True, False])
+def test_pan_flings(mobile):
+    # A pan on mobile, a drag on the desktop
+    widget, d = zoomed(mobile)
+    pan(d, 20, 15)
+    left = widget._zi_region[0]
+    assert widget._zi_fling_step_trigger.is_triggered
+    d.advance(10 * FRAME)
+    # The image moves on, the region moves right
+    assert widget._zi_region[0] > left
+    # Past the time a swipe would be detected
+    d.advance(0.5)
+    assert widget._zi_region[0] > left
+
+def test_swipe_does_not_fling():
+    # Fast for longer than a swipe takes to detect
+    widget, d = zoomed(True)
+    pan(d, 12, round(0.4 / SAMPLE))
+    assert not widget._zi_fling_step_trigger.is_triggered
+
+def test_pinch_does_not_fling():
+    widget, d = zoomed(True)
+    t0 = d.down(400, 300)
+    for i in range(1, 6):
+        d.move(t0, 400 - 20 * i, 300)
+    t1 = d.down(500, 300, 0.01)
+    for i in range(1, 6):
+        d.move(t1, 500 + 20 * i, 300)
+    d.up(t0)
+    d.up(t1, 0.01)
+    assert not widget._zi_fling_step_trigger.is_triggered
+
+def test_edge_springs_back():
+    # A fling to the left edge goes past it, and eases back to it
+    widget, d = zoomed(True)
+    pan(d, -20, 15)
+    offsets = []
+    for i in range(120):
+        d.advance(FRAME)
+        offsets.append(widget._zi_overscroll.x)
+        if offsets[-1]:
+            # The region stays at the edge
+            assert widget._zi_region[0] == 0
+    assert max(offsets) > 0
+    assert min(offsets) == 0
+    assert offsets[-1] == 0
+    assert not widget._zi_fling_step_trigger.is_triggered
+    peak = offsets.index(max(offsets))
+    # Out then back, without oscillating
+    assert offsets[:peak + 1] == sorted(offsets[:peak + 1])
+    assert offsets[peak:] == sorted(offsets[peak:], reverse=True)
+
+def test_touch_stops_overscroll():
+    widget, d = zoomed(True)
+    pan(d, -20, 15)
+    while not widget._zi_overscroll.x:
+        d.advance(FRAME)
+    d.up(d.down(100, 100))
+    assert widget._zi_overscroll.xy == (0, 0)
@@ -0,0 +1,73 @@
+from time import sleep
+from kivy.clock import Clock
+import pytest
+from zoomimage import ZoomImage
+from texturecache import TextureCache
+
+def settle(widget):
+    # Until the background decodes are uploaded
+    for i in range(200):
+        Clock.tick()
+        pending = getattr(widget, '_zi_pending', None)
+        if not widget._zi_futures and not pending:
+            Clock.tick()
+            return
+        sleep(0.01)
+    raise AssertionError('background decodes did not finish')
+
+@pytest.fixture
+def truncated(tmp_path):
+    # A valid header, the decode fails
+    data = open('test.jpg', 'rb').read()
+    path = tmp_path / 'truncated.jpg'
+    path.write_bytes(data[:len(data) // 3])
+    return str(path)
+
+@pytest.fixture
+def junk(tmp_path):
+    path = tmp_path / 'junk.jpg'
+    path.write_bytes(b'not an image')
+    return str(path)
+
+@pytest.mark.parametrize('tiled', [False, True])
+def test_not_an_image(junk, tiled):
+    widget = ZoomImage(junk, tiled=tiled)
+    settle(widget)
+    assert not widget.loading
+    assert widget.texture is None
+
+@pytest.mark.parametrize('tiled', [False, True])
+def test_missing(tmp_path, tiled):
+    widget = ZoomImage(str(tmp_path / 'missing.jpg'), tiled=tiled)
+    settle(widget)
+    assert not widget.loading
+
+def test_preview_fails(truncated):
+    widget = ZoomImage(truncated, tiled=True)
+    settle(widget)
+    assert not widget.loading
+    assert widget._zi_preview is None
+
+def test_tile_fails_keeps_preview():
+    widget = ZoomImage('test.jpg', tiled=True)
+    widget.size = (800, 600)
+    settle(widget)
+    preview = widget._zi_preview
+    assert preview is not None
+
+    def fail(level, col, row):
+        raise OSError('image file is truncated')
+    widget.pyramid.decode_tile = fail
+    widget.texture_cache = TextureCache()
+    widget._zi_failed.clear()
+    widget._zi_tiles.clear()
+    for i in range(8):
+        widget._zi_set_origin(400, 300)
+        widget._zi_transform(400, 300, 1.3)
+    assert widget._zi_pending
+    settle(widget)
+    assert widget._zi_failed
+    assert widget._zi_preview is preview
+    # A failed tile is not requested again
+    widget._zi_refresh()
+    assert not widget._zi_pending
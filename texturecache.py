@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+### A least recently used cache of Textures
+###################################################
+# Textures are keyed by the caller, for example
+# (source, level, col, row) for a tile. The cache holds at most `budget`
+# bytes of texture data, the least recently used textures are evicted
+# first. A Texture still referenced elsewhere, such as by a visible
+# Rectangle, stays in GPU memory until it is released there.
+#
+# `hits`, `misses`, and `evictions` count cache activity, for tuning the
+# budget on low memory devices.
+
+BUDGET = 64 * 1024 * 1024     # bytes
+
+_BYTES_PER_PIXEL = {'rgba': 4, 'bgra': 4, 'rgb': 3, 'bgr': 3,
+                    'luminance_alpha': 2, 'luminance': 1, 'alpha': 1,
+                    'red': 1, 'rg': 2}
+
+def texture_bytes(texture):
+    w, h = texture.size
+    return w * h * _BYTES_PER_PIXEL.get(texture.colorfmt, 4)
+
+
+class TextureCache:
+
+    def __init__(self, budget=BUDGET):
+        self.budget = budget
+        self._textures = OrderedDict()    # key -> (texture, bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._textures)
+
+    def __contains__(self, key):
+        return key in self._textures
+
+    def get(self, key):
+        entry = self._textures.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._textures.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, texture):
+        self.discard(key)
+        size = texture_bytes(texture)
+        self._textures[key] = (texture, size)
+        self.bytes += size
+        self._evict()
+        return texture
+
+    def discard(self, key):
+        entry = self._textures.pop(key, None)
+        if entry:
+            self.bytes -= entry[1]
+
+    def resize(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def clear(self):
+        self._textures.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {'textures': len(self), 'bytes': self.bytes,
+                'budget': self.budget, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    def _evict(self):
+        # A texture larger than the budget is evicted as soon as it is added
+        while self.bytes > self.budget and self._textures:
+            key, (texture, size) = self._textures.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+### The cache shared by all widgets
+###################################################
+
+_SHARED = None
+
+def shared_cache():
+    global _SHARED
+    if _SHARED is None:
+        _SHARED = TextureCache()
+    return _SHARED
@@ -0,0 +1,232 @@
+from kivy.graphics.texture import Texture
+from math import ceil, floor, log2
+from os.path import splitext
+from threading import Lock
+from xml.etree import ElementTree
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+# The largest image, in pixels, decoded as one. Below Pillow's default
+# decompression bomb limit, which is not changed. A TilePyramid of an
+# image decodes all of it at level 0, about 4 bytes per pixel, so larger
+# images must be Deep Zoom sources, see DeepZoomPyramid.
+MAX_PIXELS = 8192 * 8192
+
+### Decoded images
+###################################################
+# Decoding returns (size, colorfmt, bytes) with rows bottom up,
+# and may run on any thread. `texture_from()` uploads it, and must run
+# on the Kivy thread.
+
+def texture_from(decoded):
+    size, colorfmt, data = decoded
+    texture = Texture.create(size=size, colorfmt=colorfmt)
+    texture.blit_buffer(data, colorfmt=colorfmt, bufferfmt='ubyte')
+    return texture
+
+def _decoded(image):
+    image = image.transpose(PILImage.FLIP_TOP_BOTTOM)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    return image.size, image.mode.lower(), image.tobytes()
+
+def open_image(source):
+    # A Pillow image, the pixels are not decoded.
+    # Raises ValueError if the image is larger than MAX_PIXELS, or is
+    # missing or not an image.
+    try:
+        image = PILImage.open(source)
+    except PILImage.DecompressionBombError:
+        image = None
+    except OSError as error:
+        raise ValueError('{} is not readable: {}'.format(source, error))
+    if image is None or image.width * image.height > MAX_PIXELS:
+        if image is not None:
+            image.close()
+        raise ValueError('{} is larger than {} pixels, use a Deep Zoom '
+                         'source'.format(source, MAX_PIXELS))
+    return image
+
+def source_size(source):
+    # From the file header, or None without Pillow
+    if PILImage is None:
+        return None
+    with open_image(source) as image:
+        return image.size
+
+def decode_preview(source, max_size):
+    # The whole image at most max_size pixels on a side.
+    # JPEG is decoded at a reduced scale, without a full decode.
+    if PILImage is None:
+        raise ImportError('decode_preview requires Pillow')
+    with open_image(source) as image:
+        image.draft('RGB', (max_size, max_size))
+        image.thumbnail((max_size, max_size))
+        return _decoded(image)
+
+### A tiled image pyramid
+###################################################
+# Level 0 is the source image, each level above is half the resolution
+# of the one below. The top level fits in one tile.
+# Each level is split into tile_size x tile_size tiles, a tile is
+# decoded and uploaded to a Texture only when it is requested.
+#
+# Tiles are indexed (level, col, row) with row 0 at the bottom, and
+# positions are in source pixels with the origin at the bottom left,
+# the same as Kivy texture coordinates.
+#
+# Tiles may be decoded on any thread, and uploaded on the Kivy thread.
+#
+# The source image is decoded whole at level 0, and each level above is
+# reduced from it, so CPU memory grows with the image size, up to
+# MAX_PIXELS. Only the uploaded tiles depend on the view. For memory
+# bounded by the view use a Deep Zoom source, see open_pyramid().
+#
+# Requires Pillow.
+
+def open_pyramid(source, tile_size=512):
+    # A DeepZoomPyramid for a .dzi source, else a TilePyramid.
+    # Raises ValueError if the source is too large for a TilePyramid.
+    if splitext(source)[1].lower() == '.dzi':
+        return DeepZoomPyramid(source)
+    return TilePyramid(source, tile_size)
+
+
+class TilePyramid:
+
+    def __init__(self, source, tile_size=512):
+        if PILImage is None:
+            raise ImportError('TilePyramid requires Pillow')
+        self.source = source
+        self.tile_size = tile_size
+        self._lock = Lock()
+        self.size = self._open()
+        self.level_count = 1 +\
+            max(0, ceil(log2(max(self.size) / self.tile_size)))
+
+    def _open(self):
+        # Returns the source size
+        self._levels = [open_image(self.source)]
+        return self._levels[0].size
+
+    def level_for(self, source_per_pixel):
+        # The level with about one texture pixel per screen pixel
+        # for a view showing source_per_pixel source pixels per screen pixel.
+        if source_per_pixel <= 1:
+            return 0
+        return min(self.level_count - 1, floor(log2(source_per_pixel)))
+
+    def span(self, level):
+        # The size of a tile at this level, in source pixels
+        return self.tile_size * 2 ** level
+
+    def tiles_in(self, level, left, bottom, right, top):
+        # The (col, row) of the tiles at this level that intersect the
+        # source region.
+        span = self.span(level)
+        w, h = self.size
+        c0 = max(0, floor(left / span))
+        r0 = max(0, floor(bottom / span))
+        c1 = min(ceil(w / span), ceil(right / span))
+        r1 = min(ceil(h / span), ceil(top / span))
+        return [(c, r) for r in range(r0, r1) for c in range(c0, c1)]
+
+    def tile_region(self, level, col, row):
+        # left, bottom, right, top of a tile, in source pixels
+        span = self.span(level)
+        w, h = self.size
+        return (col * span, row * span,
+                min(w, (col + 1) * span), min(h, (row + 1) * span))
+
+    def load_tile(self, level, col, row):
+        # Decode a tile and upload it to a new Texture
+        return texture_from(self.decode_tile(level, col, row))
+
+    def decode_tile(self, level, col, row):
+        left, bottom, right, top = self.tile_region(level, col, row)
+        f = 2 ** level
+        h = self.size[1]
+        # PIL rows are top down
+        box = (left // f, (h - top) // f,
+               ceil(right / f), ceil((h - bottom) / f))
+        with self._lock:
+            tile = self._level(level).crop(box)
+        return _decoded(tile)
+
+    def decode_preview(self):
+        # The whole image in one tile
+        return decode_preview(self.source, self.tile_size)
+
+    def preview(self):
+        return texture_from(self.decode_preview())
+
+    def _level(self, level):
+        # Each level is built from the one below, once.
+        while len(self._levels) <= level:
+            below = self._levels[-1]
+            self._levels.append(below.reduce(2) if below.width > 1 and
+                                below.height > 1 else below)
+        return self._levels[level]
+
+
+### A Deep Zoom pyramid
+###################################################
+# A pyramid already split into tiles, in the Deep Zoom layout: the
+# descriptor `name.dzi` gives the size, tile size, overlap and format,
+# and tile `col_row.format` of Deep Zoom level n is in `name_files/n/`.
+# Deep Zoom levels count up from a 1 x 1 image to the full size, rows
+# from the top, and each tile has `Overlap` pixels from its neighbours.
+#
+# Only the requested tiles are read, memory does not depend on the image
+# size. Tiles are aligned to the top edge, so tiles_in() and tile_region()
+# count rows from the top, a tile is still a (level, col, row) key.
+# The tile size is the descriptor's.
+
+class DeepZoomPyramid(TilePyramid):
+
+    def _open(self):
+        root = ElementTree.parse(self.source).getroot()
+        size = next(e for e in root.iter() if e.tag.endswith('Size'))
+        self.tile_size = int(root.get('TileSize'))
+        self._overlap = int(root.get('Overlap', 0))
+        self._format = root.get('Format')
+        self._files = splitext(self.source)[0] + '_files'
+        width, height = int(size.get('Width')), int(size.get('Height'))
+        self._max_level = ceil(log2(max(width, height, 1)))
+        return width, height
+
+    def tiles_in(self, level, left, bottom, right, top):
+        span = self.span(level)
+        w, h = self.size
+        c0 = max(0, floor(left / span))
+        r0 = max(0, floor((h - top) / span))
+        c1 = min(ceil(w / span), ceil(right / span))
+        r1 = min(ceil(h / span), ceil((h - bottom) / span))
+        return [(c, r) for r in range(r0, r1) for c in range(c0, c1)]
+
+    def tile_region(self, level, col, row):
+        span = self.span(level)
+        w, h = self.size
+        return (col * span, max(0, h - (row + 1) * span),
+                min(w, (col + 1) * span), h - row * span)
+
+    def decode_tile(self, level, col, row):
+        # Read the tile and remove the overlap
+        t = self.tile_size
+        f = 2 ** level
+        w, h = self.size
+        width = min(t, ceil(w / f) - col * t)
+        height = min(t, ceil(h / f) - row * t)
+        left = self._overlap if col else 0
+        top = self._overlap if row else 0
+        path = '{}/{}/{}_{}.{}'.format(self._files, self._max_level - level,
+                                       col, row, self._format)
+        with PILImage.open(path) as tile:
+            return _decoded(tile.crop((left, top,
+                                       left + width, top + height)))
+
+    def decode_preview(self):
+        # The top level is one tile
+        return self.decode_tile(self.level_count - 1, 0, 0)
@@ -0,0 +1,118 @@
+from struct import Struct
+
+### Touch recordings
+###################################################
+# A recording is the touch down, move, and up events seen by one widget,
+# for replay with `gesturebench.py --replay FILE`.
+#
+# File format, little endian:
+#     header  '4sHdd'    magic b'CGTR', version, widget width, height
+#     event   'BBBIddd'  kind, flags, button, touch id,
+#                        time (sec from the first event),
+#                        x, y (pixels from the widget's origin)
+# kind is DOWN, MOVE, or UP. button indexes BUTTONS. flags are
+# BUTTON_PROFILE ('button' is in touch.profile), DOUBLE_TAP, TRIPLE_TAP.
+# Other profile values are not recorded.
+#
+# Events are 31 bytes. Values are stored as doubles, so a replay sees
+# the recorded values exactly.
+
+MAGIC = b'CGTR'
+VERSION = 1
+DOWN, MOVE, UP = range(3)
+BUTTONS = (None, 'left', 'right', 'middle', 'scrollup', 'scrolldown',
+           'scrollleft', 'scrollright')
+BUTTON_PROFILE, DOUBLE_TAP, TRIPLE_TAP = 1, 2, 4
+
+_HEADER = Struct('<4sHdd')
+_EVENT = Struct('<BBBIddd')
+
+
+class TouchRecording:
+
+    def __init__(self, size=(0, 0), events=None):
+        self.size = tuple(size)     # of the widget
+        # (kind, flags, button, id, time, x, y)
+        self.events = events if events is not None else []
+
+    def __len__(self):
+        return len(self.events)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, *self.size))
+            for event in self.events:
+                f.write(_EVENT.pack(*event))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        magic, version, width, height = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} touch recording'.format(
+                filename, VERSION))
+        events = list(_EVENT.iter_unpack(data[_HEADER.size:]))
+        return cls((width, height), events)
+
+
+class TouchRecorder:
+    # Records the touches dispatched to a widget, bound to its on_touch_*
+    # events so the widget's own handlers are unchanged.
+    # Only touches that start on the widget are recorded.
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.recording = None
+        self._ids = {}       # touch uid -> recorded id
+        self._next_id = 0
+        self._start = None
+
+    def start(self):
+        self.recording = TouchRecording(self.widget.size)
+        self._ids = {}
+        self._next_id = 0
+        self._start = None
+        self.widget.bind(on_touch_down=self._down,
+                         on_touch_move=self._move,
+                         on_touch_up=self._up)
+        return self.recording
+
+    def stop(self):
+        self.widget.unbind(on_touch_down=self._down,
+                           on_touch_move=self._move,
+                           on_touch_up=self._up)
+        return self.recording
+
+    def _down(self, widget, touch):
+        if touch.uid not in self._ids and\
+           widget.collide_point(touch.x, touch.y):
+            self._next_id += 1
+            self._ids[touch.uid] = self._next_id
+            self._record(DOWN, touch, touch.time_start)
+
+    def _move(self, widget, touch):
+        if touch.grab_current is None and touch.uid in self._ids:
+            self._record(MOVE, touch, touch.time_update)
+
+    def _up(self, widget, touch):
+        if touch.grab_current is None and touch.uid in self._ids:
+            end = touch.time_end if touch.time_end >= 0 else touch.time_update
+            self._record(UP, touch, end)
+            del self._ids[touch.uid]
+
+    def _record(self, kind, touch, time):
+        if self._start is None:
+            self._start = time
+        flags = 0
+        if 'button' in touch.profile:
+            flags |= BUTTON_PROFILE
+        if touch.is_double_tap:
+            flags |= DOUBLE_TAP
+        if touch.is_triple_tap:
+            flags |= TRIPLE_TAP
+        button = getattr(touch, 'button', None)
+        self.recording.events.append(
+            (kind, flags, BUTTONS.index(button) if button in BUTTONS else 0,
+             self._ids[touch.uid], time - self._start,
+             touch.x - self.widget.x, touch.y - self.widget.y))
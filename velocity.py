@@ -0,0 +1,153 @@
+from math import sqrt, exp, ceil
+from array import array
+
+### Velocity estimate
+###################################################
+# Velocity and acceleration of a moving point, from the timestamped
+# positions of the last `window` seconds. The positions are kept in a
+# fixed size ring buffer of doubles, so adding a sample allocates nothing.
+# By default the buffer holds `window` seconds at MAX_SAMPLE_RATE, setting
+# a longer `window` enlarges it.
+#
+# 'least_squares' fits x(t) and y(t) with a quadratic over the window,
+# velocity and acceleration are its derivatives at the last sample.
+# 'exponential' smooths the velocity between consecutive samples, and
+# its rate of change, with time constant `window`; it has less lag and
+# more noise.
+# Units are position units per second (per second).
+
+MAX_SAMPLE_RATE = 480    # Hz, the fastest expected digitizer
+
+class VelocityEstimator:
+
+    def __init__(self, window=0.2, capacity=None, method='least_squares'):
+        self.method = method
+        self._t = self._x = self._y = array('d')
+        self._window = 0
+        self.window = window
+        if capacity is not None and capacity > len(self._t):
+            self._allocate(capacity)
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, window):
+        self._window = window
+        capacity = ceil(window * MAX_SAMPLE_RATE) + 2
+        if capacity > len(self._t):
+            self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        # Samples are lost
+        self._t = array('d', bytes(8 * capacity))
+        self._x = array('d', bytes(8 * capacity))
+        self._y = array('d', bytes(8 * capacity))
+        self.reset()
+
+    def reset(self):
+        self._count = 0
+        self._head = 0          # index of the next sample
+        self._vx = self._vy = self._ax = self._ay = 0.0
+        self._fitted = True
+
+    def add(self, t, x, y):
+        n = len(self._t)
+        if self._count:
+            last = (self._head - 1) % n
+            dt = t - self._t[last]
+            if dt <= 0:
+                # same timestamp, the newer position replaces the older
+                self._x[last], self._y[last] = x, y
+                self._fitted = False
+                return
+            if self.method == 'exponential':
+                self._smooth(dt, (x - self._x[last]) / dt,
+                             (y - self._y[last]) / dt)
+        self._t[self._head], self._x[self._head], self._y[self._head] = t, x, y
+        self._head = (self._head + 1) % n
+        self._count = min(self._count + 1, n)
+        self._fitted = False
+
+    def velocity(self):
+        self._fit()
+        return self._vx, self._vy
+
+    def acceleration(self):
+        self._fit()
+        return self._ax, self._ay
+
+    def speed(self):
+        self._fit()
+        return sqrt(self._vx ** 2 + self._vy ** 2)
+
+    def _smooth(self, dt, vx, vy):
+        if self._count == 1:
+            # the first velocity is not smoothed
+            self._vx, self._vy = vx, vy
+            return
+        alpha = 1 - exp(-dt / self.window)
+        dvx = alpha * (vx - self._vx)
+        dvy = alpha * (vy - self._vy)
+        self._vx += dvx
+        self._vy += dvy
+        self._ax += alpha * (dvx / dt - self._ax)
+        self._ay += alpha * (dvy / dt - self._ay)
+
+    def _fit(self):
+        if self._fitted:
+            return
+        self._fitted = True
+        if self.method != 'least_squares':
+            return
+        # Sums for the normal equations, t relative to the last sample.
+        # The last two samples are always used, whatever their age.
+        n = len(self._t)
+        i = (self._head - 1) % n
+        t0 = self._t[i]
+        s0 = s1 = s2 = s3 = s4 = 0.0
+        sx = stx = sttx = sy = sty = stty = 0.0
+        for k in range(self._count):
+            t = self._t[i] - t0
+            if k > 1 and t < -self.window:
+                break
+            x, y = self._x[i], self._y[i]
+            tt = t * t
+            s0 += 1
+            s1 += t
+            s2 += tt
+            s3 += tt * t
+            s4 += tt * tt
+            sx += x
+            stx += t * x
+            sttx += tt * x
+            sy += y
+            sty += t * y
+            stty += tt * y
+            i = (i - 1) % n
+        if s0 < 2:
+            self._vx = self._vy = self._ax = self._ay = 0.0
+        elif s0 == 2:
+            # a line, no acceleration
+            self._vx = (stx - s1 * sx / 2) / (s2 - s1 * s1 / 2)
+            self._vy = (sty - s1 * sy / 2) / (s2 - s1 * s1 / 2)
+            self._ax = self._ay = 0.0
+        else:
+            # x(t) = a + b t + c t^2, by Cramer's rule
+            det = (s0 * (s2 * s4 - s3 * s3) - s1 * (s1 * s4 - s2 * s3) +
+                   s2 * (s1 * s3 - s2 * s2))
+            if not det:
+                return
+            self._vx = (s0 * (stx * s4 - s3 * sttx) -
+                        sx * (s1 * s4 - s2 * s3) +
+                        s2 * (s1 * sttx - s2 * stx)) / det
+            self._vy = (s0 * (sty * s4 - s3 * stty) -
+                        sy * (s1 * s4 - s2 * s3) +
+                        s2 * (s1 * stty - s2 * sty)) / det
+            self._ax = 2 * (s0 * (s2 * sttx - stx * s3) -
+                            s1 * (s1 * sttx - stx * s2) +
+                            sx * (s1 * s3 - s2 * s2)) / det
+            self._ay = 2 * (s0 * (s2 * stty - sty * s3) -
+                            s1 * (s1 * stty - sty * s2) +
+                            sy * (s1 * s3 - s2 * s2)) / det
@@ -1,7 +1,27 @@
 from kivy.uix.image import Image
-from kivy.core.image import Image as CoreImage
-from kivy.properties import StringProperty
+from kivy.core.image import Image as CoreImage, ImageLoader
+from kivy.clock import Clock
+from kivy.logger import Logger
+from kivy.graphics import Color, Rectangle, InstructionGroup, PushMatrix,\
+    PopMatrix, Translate
+from kivy.properties import StringProperty, BooleanProperty, NumericProperty,\
+    ObjectProperty
+from functools import partial
+from math import exp
 from gestures4kivy import CommonGestures
+from velocity import VelocityEstimator
+from tilepyramid import open_pyramid, texture_from, source_size,\
+    decode_preview
+from backgroundloader import run_in_background
+from texturecache import shared_cache
+
+PREVIEW_SIZE = 512     # pixels, the long side of a preview
+FLING_DECAY = 0.325    # sec, time constant of the fling speed
+FLING_MIN_SPEED = 50   # pixels/sec, a slower release does not fling
+FLING_SPRING = 0.08    # sec, time constant of the return from past an edge
+PREFETCH_AHEAD = 0.25  # sec, the prediction of a pan or fling
+PREFETCH_ZOOM_STEPS = 4  # cgb_zoom events, the prediction of a zoom
+PREFETCH_TILES = 8     # the most tiles decoded ahead of the view
 
 class ZoomImage(Image, CommonGestures):
 
@@ -9,11 +29,69 @@ class ZoomImage(Image, CommonGestures):
     # Controlled by pan and zoom gestures.
     #
     # Optimized for resolution by selecting from the texture.
+    #
+    # If `tiled` the source is not loaded as one texture. It is read as
+    # a TilePyramid, and only the tiles that intersect the displayed region,
+    # at the level that matches the screen resolution, are uploaded.
+    # A preview of the whole image is shown under the tiles.
+    # Tiled requires Pillow.
+    # Only for a Deep Zoom (.dzi) source does memory depend on the widget
+    # size and not the image size, it is read one tile at a time.
+    # An image file is decoded whole in CPU memory, only its GPU memory
+    # depends on the widget size. It is limited to tilepyramid.MAX_PIXELS,
+    # a larger image is logged and not shown.
+    #
+    # If `load_in_background` the source, or its tiles, are decoded on a
+    # worker thread and uploaded from a Clock callback. With Pillow a low
+    # resolution preview is shown first, and gestures act on the preview
+    # until the full resolution replaces it. `loading` is True until then.
+    #
+    # Decoded textures, full images, previews, and tiles, are kept in
+    # `texture_cache`, by default the cache shared by all ZoomImages.
+    # Revisiting an image or a tile does not decode or upload it again.
+    # Regions are not cached, get_region() shares the texture's GPU memory.
+    #
+    # If `kinetic` a pan, scroll, or drag continues after the finger lifts,
+    # at the release velocity, slowing with time constant FLING_DECAY.
+    # At an edge of the image it continues past the edge, drawn outside
+    # the image, on a critically damped spring that eases it back to the
+    # edge without reversing. A swipe does not fling.
+    # Each frame only the region is updated, the texture region and tiles
+    # are redrawn once per frame. A touch stops the fling.
+    #
+    # If `tiled` and `load_in_background`, the tiles of the region
+    # expected next, from the pan or fling velocity and the zoom
+    # direction, are decoded ahead into `texture_cache`. A new prediction
+    # cancels the decodes it no longer needs.
 
     core_source = StringProperty(None)
+    tiled = BooleanProperty(False)
+    tile_size = NumericProperty(512)
+    load_in_background = BooleanProperty(True)
+    loading = BooleanProperty(False)
+    texture_cache = ObjectProperty(None)
+    kinetic = BooleanProperty(False)
 
     def __init__(self, source, **args):
+        self._zi_velocity = VelocityEstimator()
+        self._zi_fling_x = self._zi_fling_y = 0   # pan since touch down
+        self._zi_fling_vx = self._zi_fling_vy = 0
+        self._zi_fling_touch = None   # the touch that pans, until it lifts
+        self._zi_spring_x = self._zi_spring_y = False   # past an edge
+        self._zi_overscroll = Translate(0, 0)   # widget pixels past the edge
+        self._zi_fling_step_trigger = Clock.create_trigger(
+            self._zi_fling_step, 0, interval=True)
+        self._zi_zoom_step = (1, 0, 0)    # last delta_scale, focus x, y
+        self._zi_prefetch = {}            # (level, col, row) -> Future
+        self._zi_predict_trigger = Clock.create_trigger(self._zi_predict)
         super().__init__(**args)
+        # The overscroll moves the image and its tiles
+        self.canvas.before.add(PushMatrix())
+        self.canvas.before.add(self._zi_overscroll)
+        self._zi_tile_group = InstructionGroup()
+        self.canvas.after.add(Color(1, 1, 1, 1))
+        self.canvas.after.add(self._zi_tile_group)
+        self.canvas.after.add(PopMatrix())
         self.core_source = source
         # Normal operation requires `keep_ratio` and `allow_stretch`
         # are both True.
@@ -21,27 +99,228 @@ class ZoomImage(Image, CommonGestures):
         self.allow_stretch = True
 
     def on_core_source(self, *args):
-        self.core_image = CoreImage(self.core_source)
-        self._zi_image_location_in_widget()
-        self._zi_init()
+        # Forget a previous source
+        self._zi_fling_stop()
+        for future in self._zi_prefetch.values():
+            future.cancel()
+        self._zi_prefetch = {}
+        self._zi_failed = set()   # (level, col, row) of tiles not decoded
+        for future in getattr(self, '_zi_futures', []):
+            future.cancel()
+        self._zi_futures = []
+        self._zi_redraw = Clock.create_trigger(self._zi_refresh)
+        self._zi_full = None      # the full resolution texture
+        self._zi_preview = None
+        self._zi_region = None
+        self._zi_zoom_state = 1
+        self._zi_region_pos = {'left' : 0, 'bottom' : 0}
+        background = self.load_in_background
+        cache = self._zi_cache()
+        source = self.core_source
+        if self.tiled:
+            try:
+                self.pyramid = open_pyramid(source, int(self.tile_size))
+            except ValueError as error:
+                # Too large to decode, show nothing
+                Logger.error('ZoomImage: {}'.format(error))
+                self.pyramid = None
+                self._zi_source_size = None
+                self.loading = False
+                self._zi_refresh()
+                return
+            self._zi_source_size = self.pyramid.size
+            self._zi_tiles = {}       # (level, col, row) -> texture
+            self._zi_tile_rects = {}  # (level, col, row) -> Rectangle
+            self._zi_pending = {}     # (level, col, row) -> Future
+            self._zi_tile_group.clear()
+            key = (source, 'preview', self.pyramid.tile_size)
+            self._zi_preview = cache.get(key)
+            if self._zi_preview is None and background:
+                self._zi_load(self._zi_preview_loaded, key,
+                              self.pyramid.decode_preview)
+            elif self._zi_preview is None:
+                self._zi_preview = cache.put(key, self.pyramid.preview())
+            self.loading = self._zi_preview is None
+        else:
+            key = (source, 'full')
+            self._zi_full = cache.get(key)
+            if self._zi_full is None and background:
+                # The size is known from the header, if Pillow is available
+                try:
+                    self._zi_source_size = source_size(source)
+                except ValueError:
+                    # No preview, the full decode may still succeed
+                    self._zi_source_size = None
+                if self._zi_source_size:
+                    self._zi_load_preview(source)
+                self._zi_load(self._zi_full_loaded, key,
+                              ImageLoader.load, source)
+            elif self._zi_full is None:
+                self._zi_full = cache.put(key, CoreImage(source).texture)
+            if self._zi_full:
+                self._zi_source_size = self._zi_full.size
+            self.loading = self._zi_full is None
+        self._zi_refresh()
 
     def on_size(self, *args):
         self._zi_image_location_in_widget()
+        if self.tiled and self.core_source:
+            self._zi_redraw()
+
+    def on_pos(self, *args):
+        if self.tiled and self.core_source:
+            self._zi_redraw()
+
+    # Background loading
+    ################################################
+
+    def _zi_cache(self):
+        if self.texture_cache is None:
+            return shared_cache()
+        return self.texture_cache
+
+    def _zi_load(self, callback, key, function, *args):
+        self._zi_futures.append(
+            run_in_background(partial(callback, key), function, *args))
+
+    def _zi_load_preview(self, source):
+        key = (source, 'preview', PREVIEW_SIZE)
+        self._zi_preview = self._zi_cache().get(key)
+        if self._zi_preview is None:
+            self._zi_load(self._zi_preview_loaded, key,
+                          decode_preview, source, PREVIEW_SIZE)
+
+    def _zi_upload(self, future, upload):
+        # The texture from a background decode, or None if it failed.
+        # A failure is logged, what is shown is not changed.
+        try:
+            return upload(future.result())
+        except Exception as error:
+            Logger.error('ZoomImage: {}: {}'.format(self.core_source, error))
+            return None
+
+    def _zi_preview_loaded(self, key, future):
+        if future not in self._zi_futures:
+            return
+        self._zi_futures.remove(future)
+        texture = self._zi_upload(future, texture_from)
+        if self.tiled:
+            self.loading = False
+        if texture is None:
+            return
+        self._zi_preview = self._zi_cache().put(key, texture)
+        self._zi_refresh()
+
+    def _zi_full_loaded(self, key, future):
+        if future not in self._zi_futures:
+            return
+        self._zi_futures.remove(future)
+        texture = self._zi_upload(future, lambda image: CoreImage(image).texture)
+        self.loading = False
+        if texture is None:
+            return
+        self._zi_full = self._zi_cache().put(key, texture)
+        self._zi_source_size = self._zi_full.size
+        self._zi_refresh()
+
+    def _zi_tile_loaded(self, key, future):
+        if self._zi_pending.get(key) is not future:
+            return
+        del self._zi_pending[key]
+        texture = self._zi_upload(future, texture_from)
+        if texture is None:
+            # Not requested again, the preview is shown
+            self._zi_failed.add(key)
+            return
+        self._zi_tiles[key] = self._zi_cache().put(self._zi_tile_key(key),
+                                                   texture)
+        # Draw the tiles that arrived this frame, once
+        self._zi_redraw()
+
+    def _zi_refresh(self, *args):
+        # Show the current region with the best available texture
+        self._zi_image_location_in_widget()
+        if not self._zi_source_size:
+            return
+        if self._zi_region:
+            self._zi_show(*self._zi_region)
+        else:
+            self._zi_init()
+
+    # State
+    ################################################
+
+    def get_state(self):
+        return {'source': self.core_source,
+                'zoom': self._zi_zoom_state,
+                'left': self._zi_region_pos['left'],
+                'bottom': self._zi_region_pos['bottom'],
+                'region': self._zi_region}
+
+    def set_state(self, state):
+        if state['source'] != self.core_source:
+            self.core_source = state['source']
+        if state['region']:
+            self._zi_zoom_state = state['zoom']
+            self._zi_region_pos = {'left': state['left'],
+                                   'bottom': state['bottom']}
+            self._zi_region = tuple(state['region'])
+            self._zi_redraw()
 
     # Gestures recognized
     ################################################
 
+    def on_touch_down(self, touch):
+        if self.collide_point(touch.x, touch.y):
+            self._zi_fling_stop()
+            self._zi_fling_x = self._zi_fling_y = 0
+            self._zi_fling_touch = None
+            self._zi_velocity.reset()
+            self._zi_velocity.add(touch.time_start, 0, 0)
+            self._zi_zoom_step = (1, 0, 0)
+        return super().on_touch_down(touch)
+
+    def on_touch_up(self, touch):
+        # The end of a pan, scroll, or drag, with its release velocity
+        if touch is self._zi_fling_touch:
+            self._zi_fling_touch = None
+            if self.kinetic:
+                self._zi_fling_start(touch)
+        return super().on_touch_up(touch)
+
     def cgb_scroll(self, touch, focus_x, focus_y, delta_y, velocity):
         self._zi_set_origin(focus_x, focus_y)
         self._zi_transform(focus_x , focus_y + delta_y, 1)    
+        self._zi_fling_sample(touch, 0, delta_y)
+        self._zi_predict_trigger()
 
     def cgb_pan(self, touch, focus_x, focus_y, delta_x, velocity):
         self._zi_set_origin(focus_x, focus_y)
         self._zi_transform(focus_x + delta_x, focus_y, 1)    
+        self._zi_fling_sample(touch, delta_x, 0)
+        self._zi_predict_trigger()
+
+    def cgb_drag(self, touch, focus_x, focus_y, delta_x, delta_y):
+        # A desktop pan
+        self._zi_set_origin(focus_x, focus_y)
+        self._zi_transform(focus_x + delta_x, focus_y + delta_y, 1)
+        self._zi_fling_sample(touch, delta_x, delta_y)
+        self._zi_predict_trigger()
+
+    def cg_swipe_horizontal(self, touch, left_to_right):
+        # A swipe pre-empts the pan, it does not fling
+        if touch is self._zi_fling_touch:
+            self._zi_fling_touch = None
+
+    def cg_swipe_vertical(self, touch, bottom_to_top):
+        if touch is self._zi_fling_touch:
+            self._zi_fling_touch = None
 
     def cgb_zoom(self, touch0, touch1, focus_x, focus_y, delta_scale):
         self._zi_set_origin(focus_x, focus_y)
         self._zi_transform(focus_x , focus_y, delta_scale)    
+        self._zi_zoom_step = (delta_scale, focus_x, focus_y)
+        self._zi_predict_trigger()
 
     def cgb_select(self, touch, focus_x, focus_y, long_press):
         self._zi_init()
@@ -50,8 +329,10 @@ class ZoomImage(Image, CommonGestures):
     ################################################
 
     def _zi_set_origin(self, x, y):
+        if not self._zi_source_size:
+            return
         iw, ih = self.norm_image_size
-        tw, th = self.core_image.size
+        tw, th = self._zi_source_size
         zoom   = self._zi_zoom_state
         left =  self._zi_region_pos['left'] 
         bottom =  self._zi_region_pos['bottom'] 
@@ -61,10 +342,10 @@ class ZoomImage(Image, CommonGestures):
             bottom + (y - self.texture_offset_y ) * th / (ih * zoom)
 
     def _zi_transform(self,x,y,scale):
-        if not self._zi_inside_image(x,y):
+        if not self._zi_source_size or not self._zi_inside_image(x,y):
             return
         iw, ih = self.norm_image_size
-        tw, th = self.core_image.size
+        tw, th = self._zi_source_size
         xt = self._zi_origin_xt
         yt = self._zi_origin_yt
         # Zoom state
@@ -91,28 +372,285 @@ class ZoomImage(Image, CommonGestures):
         elif top > th:
             bottom = th - (top - bottom)
             top = th
-        # Ignore a zoom to less than a texture pixel
-        if round(right - left) <= 0 or round(top - bottom) <= 0:
+        # Ignore a zoom to less than a texture pixel,
+        # get_region() truncates the region size.
+        if int(right - left) <= 0 or int(top - bottom) <= 0:
             return
         # Save state
         self._zi_zoom_state = zoom
         self._zi_region_pos = {'left' : left, 'bottom' : bottom}
         # Update image
-        self.texture = self.core_image.texture.get_region(left, bottom,
-                                                          right - left,
-                                                          top - bottom)
+        self._zi_show(left, bottom, right, top)
 
     def _zi_init(self):
-        self.texture = self.core_image.texture
         self._zi_zoom_state = 1               
         self._zi_region_pos = {'left' : 0, 'bottom' : 0}
+        if self._zi_source_size:
+            tw, th = self._zi_source_size
+            self._zi_show(0, 0, tw, th)
+
+    def _zi_show(self, left, bottom, right, top):
+        # Display this region of the source, using the full resolution
+        # texture, or the preview while loading.
+        self._zi_region = (left, bottom, right, top)
+        tw, th = self._zi_source_size
+        if self._zi_full:
+            if (left, bottom, right, top) == (0, 0, tw, th):
+                self.texture = self._zi_full
+            else:
+                self.texture = self._zi_full.get_region(
+                    left, bottom, right - left, top - bottom)
+        elif self._zi_preview:
+            # The preview region, at least one preview pixel
+            pw, ph = self._zi_preview.size
+            px = min(pw - 1, int(left * pw / tw))
+            py = min(ph - 1, int(bottom * ph / th))
+            self.texture = self._zi_preview.get_region(
+                px, py,
+                max(1, min(pw - px, round((right - left) * pw / tw))),
+                max(1, min(ph - py, round((top - bottom) * ph / th))))
+        if self.tiled and self._zi_preview:
+            self._zi_show_tiles(left, bottom, right, top)
+
+    def _zi_show_tiles(self, left, bottom, right, top):
+        # Draw the tiles that intersect the region, at the level for the
+        # current zoom, and release all other tiles.
+        iw, ih = self.norm_image_size
+        if iw <= 0 or ih <= 0:
+            return
+        sx = (right - left) / iw     # source pixels per screen pixel
+        sy = (top - bottom) / ih
+        ox = self.x + self.texture_offset_x
+        oy = self.y + self.texture_offset_y
+        pyramid = self.pyramid
+        level = pyramid.level_for(max(sx, sy))
+        visible = set()
+        for col, row in pyramid.tiles_in(level, left, bottom, right, top):
+            key = (level, col, row)
+            visible.add(key)
+            rect = self._zi_tile_rects.get(key)
+            if rect is None:
+                texture = self._zi_tile_texture(key)
+                if texture is None:
+                    # Decoding, the preview is shown meanwhile
+                    continue
+                rect = Rectangle(texture=texture)
+                self._zi_tile_rects[key] = rect
+                self._zi_tile_group.add(rect)
+            # The part of the tile inside the region
+            tl, tb, tr, tt = pyramid.tile_region(level, col, row)
+            vl = max(tl, left)
+            vb = max(tb, bottom)
+            vr = min(tr, right)
+            vt = min(tt, top)
+            rect.pos = (ox + (vl - left) / sx, oy + (vb - bottom) / sy)
+            rect.size = ((vr - vl) / sx, (vt - vb) / sy)
+            u0 = (vl - tl) / (tr - tl)
+            u1 = (vr - tl) / (tr - tl)
+            v0 = (vb - tb) / (tt - tb)
+            v1 = (vt - tb) / (tt - tb)
+            rect.tex_coords = (u0, v0, u1, v0, u1, v1, u0, v1)
+        for key in list(self._zi_pending):
+            if key not in visible:
+                self._zi_pending.pop(key).cancel()
+        for key in list(self._zi_tiles):
+            if key not in visible:
+                del self._zi_tiles[key]
+                rect = self._zi_tile_rects.pop(key, None)
+                if rect:
+                    self._zi_tile_group.remove(rect)
+
+    def _zi_tile_texture(self, key):
+        # The tile's texture, or None if it is being decoded
+        texture = self._zi_tiles.get(key)
+        if texture is not None or key in self._zi_pending or\
+           key in self._zi_failed:
+            return texture
+        if key in self._zi_prefetch:
+            # Predicted, now visible
+            self._zi_pending[key] = self._zi_prefetch.pop(key)
+            return None
+        cache = self._zi_cache()
+        cache_key = self._zi_tile_key(key)
+        texture = cache.get(cache_key)
+        if texture is None:
+            if self.load_in_background:
+                self._zi_pending[key] =\
+                    run_in_background(partial(self._zi_tile_loaded, key),
+                                      self.pyramid.decode_tile, *key)
+                return None
+            texture = cache.put(cache_key, self.pyramid.load_tile(*key))
+        self._zi_tiles[key] = texture
+        return texture
+
+    def _zi_tile_key(self, key):
+        # Unique across images and tile sizes
+        return (self.core_source, self.pyramid.tile_size) + key
+
+    # Kinetic fling
+    ################################################
+
+    def _zi_fling_sample(self, touch, dx, dy):
+        # The velocity of a touch pan or scroll, not a mouse wheel
+        if not touch.is_mouse_scrolling:
+            self._zi_fling_touch = touch
+            self._zi_fling_x += dx
+            self._zi_fling_y += dy
+            self._zi_velocity.add(touch.time_update,
+                                  self._zi_fling_x, self._zi_fling_y)
+
+    def _zi_fling_start(self, touch):
+        # A release after the finger stopped has no velocity
+        end = touch.time_end if touch.time_end >= 0 else touch.time_update
+        self._zi_velocity.add(end, self._zi_fling_x, self._zi_fling_y)
+        if self._zi_velocity.speed() < FLING_MIN_SPEED or not self._zi_region:
+            return
+        self._zi_fling_vx, self._zi_fling_vy = self._zi_velocity.velocity()
+        self._zi_fling_step_trigger()
+
+    def _zi_fling_stop(self):
+        self._zi_fling_step_trigger.cancel()
+        self._zi_fling_vx = self._zi_fling_vy = 0
+        self._zi_spring_x = self._zi_spring_y = False
+        self._zi_overscroll.xy = (0, 0)
+
+    def _zi_fling_step(self, dt):
+        # One frame of the fling, the exact integral of the decay over dt.
+        # An axis that reached an edge moves on the spring instead.
+        decay = exp(-dt / FLING_DECAY)
+        distance = FLING_DECAY * (1 - decay)
+        vx, vy = self._zi_fling_vx, self._zi_fling_vy
+        ox, oy = self._zi_overscroll.xy
+        hit_x, hit_y = self._zi_pan_by(
+            0 if self._zi_spring_x else vx * distance,
+            0 if self._zi_spring_y else vy * distance)
+        if self._zi_spring_x:
+            ox, vx, self._zi_spring_x = self._zi_spring(ox, vx, dt)
+        else:
+            vx *= decay
+            self._zi_spring_x = bool(hit_x)
+        if self._zi_spring_y:
+            oy, vy, self._zi_spring_y = self._zi_spring(oy, vy, dt)
+        else:
+            vy *= decay
+            self._zi_spring_y = bool(hit_y)
+        self._zi_fling_vx, self._zi_fling_vy = vx, vy
+        self._zi_overscroll.xy = (ox, oy)
+        if not self._zi_spring_x and not self._zi_spring_y and\
+           abs(vx) < FLING_MIN_SPEED and abs(vy) < FLING_MIN_SPEED:
+            self._zi_fling_stop()
+        else:
+            self._zi_predict_trigger()
+
+    def _zi_spring(self, offset, velocity, dt):
+        # The offset past an edge and its velocity after dt, on a critically
+        # damped spring with time constant FLING_SPRING, the exact solution.
+        # The last value is False when it has come to rest at the edge.
+        w = 1 / FLING_SPRING
+        e = exp(-w * dt)
+        c = velocity + w * offset
+        offset, velocity = (offset + c * dt) * e, (velocity - w * c * dt) * e
+        if abs(offset) < 0.5 and abs(velocity) < FLING_MIN_SPEED:
+            return 0, 0, False
+        return offset, velocity, True
+
+    def _zi_pan_by(self, dx, dy):
+        # Move the image dx, dy widget pixels, stopping at its edges.
+        # Only the region changes here, it is shown by the next redraw.
+        # Returns True for each axis that reached an edge.
+        iw, ih = self.norm_image_size
+        if not self._zi_region or iw <= 0 or ih <= 0:
+            return True, True
+        left, bottom, right, top = self._zi_region
+        tw, th = self._zi_source_size
+        w = right - left
+        h = top - bottom
+        x = left - dx * w / iw
+        y = bottom - dy * h / ih
+        new_left = min(max(0, x), tw - w)
+        new_bottom = min(max(0, y), th - h)
+        self._zi_region = (new_left, new_bottom, new_left + w, new_bottom + h)
+        self._zi_region_pos = {'left' : new_left, 'bottom' : new_bottom}
+        self._zi_redraw()
+        return (dx and new_left != x), (dy and new_bottom != y)
+
+    # Tile prefetch
+    ################################################
+
+    def _zi_predict(self, *args):
+        # Decode the tiles of the region expected next, once per frame
+        if not (self.tiled and self.load_in_background and
+                self._zi_region and self._zi_preview):
+            return
+        iw, ih = self.norm_image_size
+        if iw <= 0 or ih <= 0:
+            return
+        left, bottom, right, top = self._zi_region
+        tw, th = self._zi_source_size
+        w = right - left
+        h = top - bottom
+        # The image moves with the velocity, the region the other way
+        if self._zi_fling_step_trigger.is_triggered:
+            vx, vy = self._zi_fling_vx, self._zi_fling_vy
+        else:
+            vx, vy = self._zi_velocity.velocity()
+        left -= vx * PREFETCH_AHEAD * w / iw
+        bottom -= vy * PREFETCH_AHEAD * h / ih
+        # The zoom continues about its focus, not below zoom 1
+        scale, fx, fy = self._zi_zoom_step
+        if scale != 1:
+            scale = max(scale ** PREFETCH_ZOOM_STEPS,
+                        1 / self._zi_zoom_state)
+            xf = left + (fx - self.texture_offset_x) * w / iw
+            yf = bottom + (fy - self.texture_offset_y) * h / ih
+            left = xf - (xf - left) / scale
+            bottom = yf - (yf - bottom) / scale
+            w /= scale
+            h /= scale
+        left = min(max(0, left), tw - w)
+        bottom = min(max(0, bottom), th - h)
+        pyramid = self.pyramid
+        level = pyramid.level_for(max(w / iw, h / ih))
+        cache = self._zi_cache()
+        wanted = []
+        for col, row in pyramid.tiles_in(level, left, bottom,
+                                         left + w, bottom + h):
+            key = (level, col, row)
+            if key not in self._zi_tiles and key not in self._zi_pending and\
+               key not in self._zi_failed and\
+               self._zi_tile_key(key) not in cache:
+                wanted.append(key)
+        wanted = wanted[:PREFETCH_TILES]
+        for key in list(self._zi_prefetch):
+            if key not in wanted:
+                self._zi_prefetch.pop(key).cancel()
+        for key in wanted:
+            if key not in self._zi_prefetch:
+                self._zi_prefetch[key] =\
+                    run_in_background(partial(self._zi_prefetch_loaded, key),
+                                      pyramid.decode_tile, *key)
+
+    def _zi_prefetch_loaded(self, key, future):
+        if self._zi_pending.get(key) is future:
+            # It became visible while decoding
+            self._zi_tile_loaded(key, future)
+        elif self._zi_prefetch.get(key) is future:
+            del self._zi_prefetch[key]
+            texture = self._zi_upload(future, texture_from)
+            if texture is None:
+                self._zi_failed.add(key)
+            else:
+                self._zi_cache().put(self._zi_tile_key(key), texture)
 
     # Utilities
     ################################################
 
     def _zi_image_location_in_widget(self):
+        if not self._zi_source_size:
+            self.texture_offset_x = self.texture_offset_y = 0
+            return
         iw, ih = self.norm_image_size
-        tw, th = self.core_image.size
+        tw, th = self._zi_source_size
         if self.width / self.height > tw / th:
             texture_offset_x = (self.width - iw) / 2
             texture_offset_y = 0